@@ -1,14 +1,14 @@
+import atexit
 import logging
 import os
+import queue
 from pathlib import Path
-from logging import handlers, Logger, Formatter
+from logging import Logger, Formatter
+from typing import Optional
 
-
-data_file = Path('collectiondata', 'boardgamecollections.yml')
-data_file.parent.mkdir(exist_ok=True)
+__version__ = '1.1.0'
 
 log_file = Path("logs", "app.log")
-log_file.parent.mkdir(exist_ok=True)
 
 TRACE_LEVEL = logging.TRACE = 5
 logging.addLevelName(TRACE_LEVEL, "TRACE")
@@ -22,14 +22,32 @@ def monkeypatch_trace(self: logging.Logger, msg: str, *args, **kwargs) -> None:
 
 Logger.trace = monkeypatch_trace
 
-DEBUG_MODE = 'True' in os.environ.get('DEBUG_MODE')
+# set the environment variable DEBUG_MODE=True to log everything, down to TRACE
+DEBUG_MODE = 'True' in os.environ.get('DEBUG_MODE', '')
 
-log_level = TRACE_LEVEL if DEBUG_MODE else logging.INFO
 format_string = "%(asctime)s | %(name)30s | %(levelname)8s | %(message)s"
 
-file_handler = handlers.RotatingFileHandler(log_file, maxBytes=5242880, backupCount=5, encoding='utf8')
-file_handler.setFormatter(Formatter(format_string))
 
-root_log = logging.getLogger()
-root_log.setLevel(log_level)
-root_log.addHandler(file_handler)
+def setup_logging(level: Optional[int] = None, file: Path = log_file) -> 'logging.handlers.QueueListener':
+    """
+    Log to the rotating `file` from a background thread, return the (started) listener writing the file.
+
+    The logging calls only put records on a queue, the listener stops and flushes the queue at exit.
+    `level` defaults to TRACE in debug mode, else INFO. Nothing is logged until this is called.
+    """
+    # imported here, logging.handlers pulls in socket, pickle and threading
+    from logging import handlers
+
+    file.parent.mkdir(exist_ok=True)
+    file_handler = handlers.RotatingFileHandler(file, maxBytes=5242880, backupCount=5, encoding='utf8')
+    file_handler.setFormatter(Formatter(format_string))
+
+    records = queue.SimpleQueue()
+    listener = handlers.QueueListener(records, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root_log = logging.getLogger()
+    root_log.setLevel(level if level is not None else TRACE_LEVEL if DEBUG_MODE else logging.INFO)
+    root_log.addHandler(handlers.QueueHandler(records))
+    return listener
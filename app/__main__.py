@@ -1,14 +1,23 @@
-import yaml
+import argparse
+import atexit
+import contextlib
+import io
 import logging
-from typing import Optional, List, Tuple, Union, Callable
+import sys
+import time
+from typing import Optional, List, Tuple, Union, Callable, Iterable, Iterator, TYPE_CHECKING
 from pathlib import Path
 
-from app.collections import CollectionManager, BoardGameCollection
-from app.boardgame import BoardGame
-from app.menus import GameMenu, Menu
-from app.utils import str_sized
+from app import metrics, setup_logging, __version__
+from app.collections import CollectionManager
+from app.menus import GameMenu, Menu, split_command
+from app.storage import get_manager, save_manager, export_yaml, import_yaml
+from app.utils import FAILED, str_sized
 from app.utils import Whitespace
 
+if TYPE_CHECKING:
+    import cProfile
+
 log = logging.getLogger(__name__)
 
 FILENAME = 'boardgamecollections.yml'
@@ -39,8 +48,8 @@ def get_user_input(menu: Menu, manager: CollectionManager) -> Tuple[str, List[st
               f'[m:{str_sized(menu.name.lower(), 25, "...")}]'
               ' >> ')
     try:
-        args = list(input(f'{prompt}').lower().strip().split())
-        log.trace(f'(get_user_input) user >> {args}')
+        args = split_command(menu, input(f'{prompt}'))
+        log.trace('(get_user_input) user >> %s', args)
     except KeyboardInterrupt:
         return 0, 0
     if len(args) == 0:
@@ -48,7 +57,7 @@ def get_user_input(menu: Menu, manager: CollectionManager) -> Tuple[str, List[st
     else:
         action = args.pop(0)
         args.insert(0, manager)
-        log.trace(f'(get_user_input) -> ({action}, {args})')
+        log.trace('(get_user_input) -> (%s, %s)', action, args)
         return (action, args)
 
 
@@ -56,11 +65,15 @@ def main(menu: Menu, manager: CollectionManager) -> None:
     while True:
         action, args = get_user_input(menu, manager)
         if action in menu.choices:
-            ret = excecute_action(menu.choices[action], args)
+            with metrics.span(f'command {action}'):
+                ret = excecute_action(menu.choices[action], args)
             if isinstance(ret, int):
                 return
             elif isinstance(ret, str):
                 print(ret)
+            elif isinstance(ret, Iterator):
+                with metrics.span('render'):
+                    sys.stdout.writelines(ret)
             elif issubclass(ret.__class__, Menu):
                 menu = ret
                 print(Whitespace.clear)
@@ -73,6 +86,62 @@ def main(menu: Menu, manager: CollectionManager) -> None:
             print('Error: Invalid command.')
 
 
+def run_script(lines: Iterable[str], manager: CollectionManager) -> Tuple[int, int]:
+    """
+    Run menu commands non-interactively, one command per line, starting in the main menu.
+
+    Results are written to stdout as they are produced, errors and a summary to stderr.
+    Blank lines and lines starting with # are skipped, `0` stops the script.
+    Return the number of commands run and the number of them that failed.
+    """
+    menu = GameMenu()
+    commands = errors = 0
+    start = time.perf_counter()
+    for line_number, line in enumerate(lines, start=1):
+        args = split_command(menu, line)
+        if not args or args[0].startswith('#'):
+            continue
+        action = args.pop(0)
+        commands += 1
+        if action not in menu.choices:
+            errors += 1
+            print(f'Error (line {line_number}): invalid command `{action}` in {menu.name}.', file=sys.stderr)
+            continue
+        output = io.StringIO()
+        try:
+            with metrics.span(f'command {action}'), contextlib.redirect_stdout(output):
+                ret = menu.choices[action](manager, *args)
+        except TypeError:
+            errors += 1
+            print(f'Error (line {line_number}): invalid argument count for `{action}`.', file=sys.stderr)
+            continue
+        except Exception as e:
+            errors += 1
+            log.error('Command on line %d failed.', line_number, exc_info=e)
+            print(f'Error (line {line_number}): {e!r}', file=sys.stderr)
+            continue
+        if ret is FAILED:
+            # the error (and any hint printed with it) goes to stderr, marked with the line of the command
+            errors += 1
+            sys.stderr.write(output.getvalue().replace('Error: ', f'Error (line {line_number}): '))
+            continue
+        sys.stdout.write(output.getvalue())
+        if isinstance(ret, int):
+            break
+        elif isinstance(ret, str):
+            sys.stdout.write(ret[len(Whitespace.clear):] if ret.startswith(Whitespace.clear) else ret)
+            sys.stdout.write('\n')
+        elif isinstance(ret, Iterator):
+            with metrics.span('render'):
+                sys.stdout.writelines(line for line in ret if line is not Whitespace.clear)
+        elif isinstance(ret, Menu):
+            menu = ret
+    elapsed = time.perf_counter() - start
+    print(f'Info: ran {commands} commands ({errors} failed) in {elapsed:.3f}s, '
+          f'{commands / elapsed if elapsed else 0:.0f} commands/s', file=sys.stderr)
+    return commands, errors
+
+
 def get_menu() -> Menu:
     menu = GameMenu()
     print(Whitespace.clear)
@@ -81,37 +150,100 @@ def get_menu() -> Menu:
     return menu
 
 
-def get_manager(p: Path) -> CollectionManager:
-    with p.open(encoding='utf-8') as f:
-        data = yaml.safe_load(f)
-    if 'name' in data and 'items' in data and data['name'] == 'manager':
-        try:
-            manager = CollectionManager(active=None, items=                             # noqa E251
-                [BoardGameCollection(name=collection['name'],items=                     # noqa E251
-                    [BoardGame(*args) for args in collection['items']]                  # noqa E128
-                ) for collection in data['items']]
-            )
-        except Exception as e:
-            log.error('Error when reading file', exc_info=e)
-        else:
-            log.info(f'Loaded {len(manager.items)} collections from file.')
-            return manager
-    manager = CollectionManager(active=None, items=[])
-    log.warning('Could not read data from file')
-    return manager
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m app', description='Boardgame Collection Manager')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    convert = parser.add_mutually_exclusive_group()
+    convert.add_argument('--export-yaml', action='store_true',
+                         help='rewrite the yaml data file from the binary snapshot, then exit')
+    convert.add_argument('--import-yaml', action='store_true',
+                         help='rebuild the binary snapshot from the yaml data file, then exit')
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const='-',
+                        help='collect timings (see the hidden `stats` command) and profile the session with cProfile. '
+                             'The profile is printed to stderr at exit, or written to FILE for pstats / snakeviz')
+    network = parser.add_mutually_exclusive_group()
+    network.add_argument('--serve', metavar='ADDRESS', nargs='?', const='127.0.0.1:8765',
+                         help='share the collections with many clients, listen on host:port or unix:path '
+                              '(default 127.0.0.1:8765)')
+    network.add_argument('--connect', metavar='ADDRESS', nargs='?', const='127.0.0.1:8765',
+                         help='run the commands on a server started with --serve instead of the local data files')
+    parser.add_argument('--script', metavar='FILE',
+                        help='run the commands in FILE (- for stdin) without prompts, then save and exit. '
+                             'This is the default when stdin is not a terminal')
+    return parser.parse_args()
 
 
-def save_manager(p: Path, m: CollectionManager) -> None:
-    with p.open(mode='w', encoding="UTF-8") as f:
-        yaml.dump(manager.save(), f, default_flow_style=False, explicit_start=True)
+def start_profile() -> 'cProfile.Profile':
+    """Turn on `app.metrics` and start a cProfile profiler, see `stop_profile`."""
+    import cProfile
+    metrics.enable()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler: 'cProfile.Profile', file: str) -> None:
+    """Stop the profiler, print the collected timings and either print the profile or write it to `file`."""
+    import pstats
+    profiler.disable()
+    print(metrics.report(), file=sys.stderr)
+    if file == '-':
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+    else:
+        profiler.dump_stats(file)
+        print(f'Info: profile written to {file}', file=sys.stderr)
 
 
 if __name__ == "__main__":
+    args = get_args()
+    setup_logging()
+    if args.profile:
+        profiler = start_profile()
+        atexit.register(stop_profile, profiler, args.profile)
+    file = Path(FILEDIR, FILENAME)
+    if args.export_yaml:
+        export_yaml(file)
+        raise SystemExit
+    if args.import_yaml:
+        import_yaml(file)
+        raise SystemExit
+
+    if args.connect:
+        from app.client import run_client
+        run_client(args.connect)
+        raise SystemExit
+    if args.serve:
+        import asyncio
+        from app.server import serve
+        log.info('Program start (server).')
+        try:
+            asyncio.run(serve(file, args.serve))
+        except KeyboardInterrupt:
+            pass
+        log.info('Program exit.')
+        raise SystemExit
+
+    if args.script or not sys.stdin.isatty():
+        log.info('Program start (script).')
+        manager = get_manager(file)
+        # records are flushed once, by `save_manager`, instead of after every command
+        manager.journal.autoflush = False
+        try:
+            if args.script in (None, '-'):
+                _, errors = run_script(sys.stdin, manager)
+            else:
+                with open(args.script, encoding='utf-8') as f:
+                    _, errors = run_script(f, manager)
+        finally:
+            save_manager(file, manager)
+            log.info('Program exit.')
+        # the commands that succeeded are saved, the exit status tells whether any failed
+        raise SystemExit(1 if errors else 0)
+
     print(Whitespace.clear)
     log.info('Program start.')
     print(INTRODUCTION)
 
-    file = Path(FILEDIR, FILENAME)
     manager = get_manager(file)
     try:
         input('(press enter to start)')
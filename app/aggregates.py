@@ -0,0 +1,113 @@
+"""
+Running aggregates of the numeric fields of a collection's games, kept up to date as games change.
+
+Every change is O(1): a game is added to (or discarded from) the count, sum and histogram of each field.
+Minimum and maximum are read from the histogram, which only holds the distinct values of a field.
+"""
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+from app.boardgame import BOARDGAME_NUMERIC_FIELDS
+
+# fields with more distinct values than this are shown without their histogram
+HISTOGRAM_ROWS = 12
+
+
+class FieldAggregate(object):
+    """Count, sum and histogram (value -> number of games) of the games with a value for one field"""
+
+    __slots__ = ('count', 'total', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.histogram = Counter()
+
+    def add(self, value: int) -> None:
+        self.count += 1
+        self.total += value
+        self.histogram[value] += 1
+
+    def discard(self, value: int) -> None:
+        self.count -= 1
+        self.total -= value
+        self.histogram[value] -= 1
+        if not self.histogram[value]:
+            del self.histogram[value]
+
+    def merge(self, other: 'FieldAggregate') -> None:
+        self.count += other.count
+        self.total += other.total
+        self.histogram.update(other.histogram)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def min(self) -> Optional[int]:
+        return min(self.histogram) if self.histogram else None
+
+    @property
+    def max(self) -> Optional[int]:
+        return max(self.histogram) if self.histogram else None
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, FieldAggregate) and (self.count, self.total, self.histogram) == \
+            (other.count, other.total, other.histogram)
+
+
+class CollectionAggregates(object):
+    """The number of games and a `FieldAggregate` per numeric field, games without a value are not counted"""
+
+    def __init__(self, items: Iterable[Any] = ()):
+        self.games = 0
+        self.fields: Dict[str, FieldAggregate] = {field: FieldAggregate() for field in BOARDGAME_NUMERIC_FIELDS}
+        for item in items:
+            self.add(item)
+
+    def add(self, item: Any) -> None:
+        self.games += 1
+        for field, aggregate in self.fields.items():
+            value = getattr(item, field)
+            if value is not None:
+                aggregate.add(value)
+
+    def discard(self, item: Any) -> None:
+        self.games -= 1
+        for field, aggregate in self.fields.items():
+            value = getattr(item, field)
+            if value is not None:
+                aggregate.discard(value)
+
+    @classmethod
+    def rollup(cls, parts: Iterable['CollectionAggregates']) -> 'CollectionAggregates':
+        """Combine the aggregates of several collections."""
+        total = cls()
+        for part in parts:
+            total.games += part.games
+            for field, aggregate in part.fields.items():
+                total.fields[field].merge(aggregate)
+        return total
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, CollectionAggregates) and (self.games, self.fields) == (other.games, other.fields)
+
+    def report(self, title: str) -> str:
+        """Return the aggregates as a table, with the histogram of fields with few distinct values."""
+        lines = [f'{title}: {self.games} games', '',
+                 'field'.ljust(20) + 'games'.rjust(8) + 'total'.rjust(10) + 'mean'.rjust(9) + 'min'.rjust(7)
+                 + 'max'.rjust(7)]
+        for field, aggregate in self.fields.items():
+            mean = '' if aggregate.mean is None else f'{aggregate.mean:.1f}'
+            lines.append(f'{field:<20}{aggregate.count:>8}{aggregate.total:>10}{mean:>9}'
+                         f'{"" if aggregate.min is None else aggregate.min:>7}'
+                         f'{"" if aggregate.max is None else aggregate.max:>7}')
+        lines.append('')
+        for field, aggregate in self.fields.items():
+            if len(aggregate.histogram) <= HISTOGRAM_ROWS:
+                values = '  '.join(f'{value}: {count}' for value, count in sorted(aggregate.histogram.items()))
+                lines.append(f'{field:<20}{values or "-"}')
+            else:
+                lines.append(f'{field:<20}({len(aggregate.histogram)} distinct values)')
+        return '\n'.join(lines) + '\n'
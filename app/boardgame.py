@@ -1,6 +1,7 @@
-from typing import List, Dict, Callable
+from collections import namedtuple
+from typing import List, Dict, Callable, Optional, Union
 
-from app.utils import str_sized
+from app.utils import is_number
 
 
 # -- how to use field checks --
@@ -10,50 +11,136 @@ from app.utils import str_sized
 # if field in FIELD_CHECK and FIELD_CHECK['name']('test'):
 #   item._modify('name', 'test')
 
+
+# the largest value of a numeric field, the snapshot stores them as signed 64 bit integers (see `app.storage`)
+MAX_VALUE = 2 ** 63 - 1
+
+
+def _is_value(x: str) -> bool:
+    return is_number(x) and int(x) <= MAX_VALUE
+
+
 BOARDGAME_FIELD_CHECK: Dict[str, Callable[[str], bool]] = {
     'title':                lambda x: not x.isdigit(),          # noqa 
-    'players':              lambda x: x.isdigit(),              # noqa 
-    'duration':             lambda x: x.isdigit(),              # noqa 
-    'recommended_age':      lambda x: x.isdigit(),              # noqa 
-    'times_played':         lambda x: x.isdigit(),              # noqa 
-    'rating':               lambda x: x.isdigit(),              # noqa 
+    'players':              _is_value,                          # noqa 
+    'duration':             _is_value,                          # noqa 
+    'recommended_age':      _is_value,                          # noqa 
+    'times_played':         _is_value,                          # noqa 
+    'rating':               _is_value,                          # noqa 
     }
 
+BOARDGAME_NUMERIC_FIELDS = ('players', 'duration', 'recommended_age', 'times_played', 'rating')
+# fields describing the game itself, shared by every collection holding it (see `app.catalog.Catalog`)
+BOARDGAME_INFO_FIELDS = ('title', 'players', 'duration', 'recommended_age')
+
+# Column layout of a listed BoardGame, each value is cut off to leave at least 1 space to the next column.
+BOARDGAME_HEADER = '{:<30}{:>5}{:>10}{:>17}{:>14}{:>8}'.format(
+    'title', 'players', 'duration', 'recommended_age', 'times_played', 'rating')
+_format_row = '{:<30.28}{:>5.3}{:>8.7}m {:>17.15}{:>14.12}{:>8.6}'.format
+
+
+class GameInfo(namedtuple('GameInfo', BOARDGAME_INFO_FIELDS)):
+    """The metadata of a game, equal infos are stored once per manager by `app.catalog.Catalog`"""
+    __slots__ = ()
+
+
+def game_info(title: str,
+              players: Union[str, int],
+              duration: Union[str, int],
+              recommended_age: Union[str, int]) -> GameInfo:
+    """Create a GameInfo from the strings given by the user or read from file"""
+    return GameInfo(title, int(players), int(duration), int(recommended_age))
+
 
 class BoardGame(object):
+    """
+    A board game, numeric fields are stored as integers (rating is None until the game is rated).
+
+    Values are converted from / to strings only at the edges: `__init__` and `_modify` accept
+    the strings given by the user or read from file, `save` returns strings again.
+
+    The metadata fields (`BOARDGAME_INFO_FIELDS`) are read from `info`, an immutable `GameInfo` that
+    collections intern in their catalog. Editing one of them replaces `info`, the game's own fields are
+    `times_played` and `rating`.
+
+    The listed row (`__str__`) is cached until the game is modified.
+    """
+
+    __slots__ = ('info', 'times_played', 'rating', '_row')
 
     def __init__(self,
                  title: str,
-                 players: str,
-                 duration: str,
-                 recommended_age: str,
-                 times_played: str = '0',
-                 rating: str = ''):
-
-        self.title = title
-        self.players = players
-        self.duration = duration
-        self.recommended_age = recommended_age
-        self.times_played = times_played
-        self.rating = rating
-        self.name = self.title  # just an alias
+                 players: Union[str, int],
+                 duration: Union[str, int],
+                 recommended_age: Union[str, int],
+                 times_played: Union[str, int] = '0',
+                 rating: Union[str, int, None] = ''):
+
+        self.info = game_info(title, players, duration, recommended_age)
+        self.times_played = int(times_played or 0)
+        self.rating = _optional_int(rating)
+        self._row = None
+
+    @classmethod
+    def from_info(cls,
+                  info: GameInfo,
+                  times_played: Union[str, int] = '0',
+                  rating: Union[str, int, None] = '') -> 'BoardGame':
+        """Create a game of an existing (eg. catalog) `info`"""
+        game = cls.__new__(cls)
+        game.info = info
+        game.times_played = int(times_played or 0)
+        game.rating = _optional_int(rating)
+        game._row = None
+        return game
+
+    @property
+    def title(self) -> str:
+        return self.info.title
+
+    @property
+    def players(self) -> int:
+        return self.info.players
+
+    @property
+    def duration(self) -> int:
+        return self.info.duration
+
+    @property
+    def recommended_age(self) -> int:
+        return self.info.recommended_age
+
+    @property
+    def name(self) -> str:
+        """Alias of `title`"""
+        return self.info.title
 
     def _modify(self, field: str, value: str) -> None:
-        setattr(self, field, value)
+        if field in BOARDGAME_NUMERIC_FIELDS:
+            value = _optional_int(value)
+        if field in BOARDGAME_INFO_FIELDS:
+            self.info = self.info._replace(**{field: value})
+        else:
+            setattr(self, field, value)
+        self._row = None
 
-    def save(self) -> List:
-        return [self.title, self.players, self.duration, self.recommended_age, self.rating, self.times_played]
+    def save(self) -> List[str]:
+        return [self.title, str(self.players), str(self.duration), str(self.recommended_age),
+                str(self.times_played), '' if self.rating is None else str(self.rating)]
 
     def __str__(self) -> str:
-        return (''
-                + str_sized(self.title, 29).ljust(30)
-                + str_sized(self.players, 4).rjust(5)
-                + (str_sized(self.duration, 8) + 'm ').rjust(10)
-                + str_sized(self.recommended_age, 16).rjust(17)
-                + str_sized(self.times_played, 13).rjust(14)
-                + str_sized(self.rating, 7).rjust(8)
-                )
+        if self._row is None:
+            self._row = _format_row(self.title, str(self.players), str(self.duration), str(self.recommended_age),
+                                    str(self.times_played), '' if self.rating is None else str(self.rating))
+        return self._row
 
     def inc_times_played(self, inc: int = 1) -> None:
-        # I like storing my integers as strings, okay!?
-        self.times_played = f'{int(self.times_played) + inc}'
+        self.times_played += inc
+        self._row = None
+
+
+def _optional_int(value: Union[str, int, None]) -> Optional[int]:
+    """Convert `value` to an int, empty strings and None become None."""
+    if value is None or value == '':
+        return None
+    return int(value)
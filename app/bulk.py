@@ -0,0 +1,79 @@
+import csv
+import json
+import logging
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Dict, Tuple, List, Optional
+
+from app.boardgame import BoardGame, BOARDGAME_FIELD_CHECK
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('.csv', '.jsonl', '.ndjson')
+REQUIRED_FIELDS = ('title', 'players', 'duration', 'recommended_age')
+FIELDS = tuple(BOARDGAME_FIELD_CHECK)
+BATCH_SIZE = 1000
+# errors reading or writing a file, besides invalid records
+FILE_ERRORS = (OSError, UnicodeError, csv.Error)
+
+
+def read_records(p: Path) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Stream (line number, record) pairs from a csv file (with a header row) or a json lines file"""
+    with p.open(newline='', encoding='utf-8') as f:
+        if p.suffix.lower() == '.csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    yield line_number, record if isinstance(record, dict) else {}
+
+
+def parse_game(record: Dict[str, str]) -> Optional[BoardGame]:
+    """Create a BoardGame from a record, or return None if the record is invalid"""
+    values = {field: str(record.get(field) or '').strip().lower() for field in FIELDS}
+    if not all(values[field] for field in REQUIRED_FIELDS):
+        return None
+    if not all(BOARDGAME_FIELD_CHECK[field](value) for field, value in values.items() if value):
+        return None
+    return BoardGame(**values)
+
+
+def parse_games(records: Iterable[Tuple[int, Dict[str, str]]]) -> Iterator[Optional[BoardGame]]:
+    """Stream a BoardGame (or None for an invalid record) for every record"""
+    for line_number, record in records:
+        game = parse_game(record)
+        if game is None:
+            log.debug('Invalid record on line %d: %s', line_number, record)
+        yield game
+
+
+def batches(iterable: Iterable, size: int = BATCH_SIZE) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_games(p: Path, games: Iterable[BoardGame]) -> int:
+    """Stream games to a csv or json lines file, return the number of games written"""
+    written = 0
+    with p.open(mode='w', newline='', encoding='utf-8') as f:
+        if p.suffix.lower() == '.csv':
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for game in games:
+                writer.writerow(game.save())
+                written += 1
+        else:
+            for game in games:
+                f.write(json.dumps(dict(zip(FIELDS, game.save()))) + '\n')
+                written += 1
+    return written
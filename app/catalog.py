@@ -0,0 +1,64 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.boardgame import GameInfo
+
+
+class Catalog(object):
+    """
+    The game metadata (`GameInfo`) of the collections of a manager, every distinct info is stored once.
+
+    A collection interns the info of a game when the game is added and releases it when the game is removed,
+    the catalog counts the games using an entry and drops unused entries. It also remembers which collections
+    hold a game of a given title, titles are unique within a collection.
+    """
+
+    def __init__(self):
+        # info -> the shared (interned) equal info
+        self._entries: Dict[GameInfo, GameInfo] = {}
+        # interned info -> number of games using it
+        self._refs: Dict[GameInfo, int] = {}
+        # title -> the collections holding a game of that title
+        self._owners: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def intern(self, info: GameInfo, owner: Any) -> GameInfo:
+        """Return the catalog's entry equal to `info` (adding `info` if there is none), used by a game of `owner`"""
+        entry = self._entries.setdefault(info, info)
+        self._refs[entry] = self._refs.get(entry, 0) + 1
+        self._owners.setdefault(entry.title, []).append(owner)
+        return entry
+
+    def release(self, info: GameInfo, owner: Any) -> None:
+        """Undo an `intern` of `info` by `owner`"""
+        refs = self._refs[info] - 1
+        if refs:
+            self._refs[info] = refs
+        else:
+            del self._refs[info]
+            del self._entries[info]
+        owners = self._owners[info.title]
+        owners.remove(owner)
+        if not owners:
+            del self._owners[info.title]
+
+    def owners(self, title: str) -> List[Any]:
+        """Return the collections holding a game titled `title`"""
+        return self._owners.get(title, [])
+
+
+def number_entries(collections: Iterable[Any]) -> Tuple[List[GameInfo], Dict[int, int]]:
+    """
+    Return the distinct infos of the games in `collections` in order of appearance and id(info) -> position.
+
+    The collections must share a catalog, equal infos are then the same object and are told apart by id.
+    """
+    entries = []
+    positions = {}
+    for collection in collections:
+        for game in collection.items:
+            if id(game.info) not in positions:
+                positions[id(game.info)] = len(entries)
+                entries.append(game.info)
+    return entries, positions
@@ -0,0 +1,40 @@
+"""Thin line based client of the server mode, see `app.server`."""
+import socket
+import sys
+from typing import Optional, TextIO
+
+from app.server import END, parse_address
+
+
+def connect(address: str) -> socket.socket:
+    kind, host, port = parse_address(address)
+    if kind == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(host)
+        return sock
+    return socket.create_connection((host, port))
+
+
+def read_response(reader: TextIO) -> Optional[str]:
+    """Print a response of the server, return the prompt that ends it, or None if the server closed the connection."""
+    for line in reader:
+        if line.startswith(END):
+            return line[len(END):].rstrip('\n')
+        sys.stdout.write(line)
+    return None
+
+
+def run_client(address: str) -> None:
+    """Send the commands typed by the user (or read from stdin) to the server at `address`, print the responses."""
+    interactive = sys.stdin.isatty()
+    with connect(address) as sock, sock.makefile('r', encoding='utf-8', newline='\n') as reader:
+        prompt = read_response(reader)
+        while prompt is not None:
+            try:
+                line = input(prompt) if interactive else sys.stdin.readline()
+            except (EOFError, KeyboardInterrupt):
+                break
+            if not interactive and not line:
+                break
+            sock.sendall((line.rstrip('\n') + '\n').encode('utf-8'))
+            prompt = read_response(reader)
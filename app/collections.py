@@ -1,8 +1,17 @@
-from typing import List, Dict, Any, Callable, Union, Optional
-
-from app.boardgame import BoardGame, BOARDGAME_FIELD_CHECK
-from app.filters import stringify_filter_results, _filter, validate_filters
-from app.utils import Whitespace
+import heapq
+import itertools
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Union, Optional, Iterable, Iterator, Tuple
+
+from app import bulk, columnar, metrics
+from app.aggregates import CollectionAggregates
+from app.catalog import Catalog, number_entries
+from app.boardgame import BoardGame, BOARDGAME_FIELD_CHECK, BOARDGAME_NUMERIC_FIELDS, BOARDGAME_HEADER
+from app.filters import iter_filter_results, split_options, _filter, validate_filters
+from app.indexes import SortedIndex, TrigramIndex
+from app.search import SearchResult, search_collections
+from app.utils import FAILED, Failed, Whitespace, is_number, str_sized
 
 
 # -- how to use field checks --
@@ -16,6 +25,20 @@ BOARDGAME_COLLECTION_FIELD_CHECK: Dict[str, Callable[[str], bool]] = {
     'name': lambda x: not x.isdigit()
 }
 
+# options of `BoardGameCollection.list_games` and the number of values they take
+LIST_OPTIONS = {'page': 1, 'limit': 1, 'sort': 1, 'top': 2, 'asc': 0, 'desc': 0}
+# the values an option is followed by, for the error message when they are missing
+LIST_OPTION_VALUES = {'page': 'a number', 'limit': 'a number', 'sort': 'a field', 'top': 'a number and a field'}
+PAGE_SIZE = 50
+# fields the games can be sorted by
+SORT_FIELDS = ('title', *BOARDGAME_NUMERIC_FIELDS)
+# options of `CollectionManager.search`
+SEARCH_OPTIONS = {'workers': 1}
+
+# number of filter results a BoardGameCollection remembers, see `BoardGameCollection.query`
+QUERY_CACHE_SIZE = 128
+QueryCacheInfo = namedtuple('QueryCacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
 
 class BaseCollection(object):
     """Base collection class"""
@@ -25,16 +48,66 @@ class BaseCollection(object):
                  items: List[Any] = [],
                  *,
                  item_fields_check: Dict[str, Callable[[str], bool]] = {},
-                 header: str = ''):
-        self.items = items
+                 item_name_field: str = 'name',
+                 header: str = '',
+                 loader: Optional[Callable[[], List[Any]]] = None,
+                 count: int = 0):
+        # `self.items` in order, rebuilt from `_sequence` on first use after a delete
+        self._items: Optional[List[Any]] = []
+        self._loader = None
+        # changes made through the public methods are appended to `journal`, see `app.storage.Journal`
+        self.journal = None
+        # whether changes were made since the last save, see `dirty`
+        self._dirty = False
         self.name = name
         self.item_fields_check = item_fields_check
+        self.item_name_field = item_name_field
         self.header = header
+        # name -> item, kept in sync with `self.items` by `_track` / `_untrack`
+        self._by_name: Dict[str, Any] = {}
+        # item -> insertion number, in the order of `self.items`. Deleting from it is O(1), unlike from a list
+        self._sequence: Dict[Any, int] = {}
+        self._counter = itertools.count()
+        # name trigrams -> items, built on first use by `_trigram_index`
+        self._trigrams: Optional[TrigramIndex] = None
+        for item in items:
+            self._insert(item)
+        # lazy collections get their items from `loader` on first use, until then `count` is their number
+        self._loader = loader
+        self._count = count
+
+    @property
+    def size(self) -> int:
+        """The number of items, without loading a lazy collection"""
+        return self._count if self._loader is not None else len(self._sequence)
+
+    @property
+    def items(self) -> List[Any]:
+        self._load()
+        if self._items is None:
+            self._items = list(self._sequence)
+        return self._items
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    def _load(self) -> None:
+        """Read the items of a lazy collection, if that has not been done yet."""
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            for item in loader():
+                self._insert(item)
 
     def __str__(self) -> str:
-        title = Whitespace.big_title(f'Collection: {self.name}')
-        text = '\n'.join(f'{i}'.ljust(7) + str(item) for i, item in enumerate(self.items))
-        return (title + Whitespace.line + self.header + Whitespace.weak_line + text + Whitespace.line + '\n')
+        return ''.join(self.iter_lines())
+
+    def iter_lines(self) -> Iterator[str]:
+        """Stream the display format of the collection, row by row."""
+        yield Whitespace.big_title(f'Collection: {self.name}') + Whitespace.line + self.header + Whitespace.weak_line
+        for i, item in enumerate(self.items):
+            yield f'\n{i:<7}{item}' if i else f'{i:<7}{item}'
+        yield Whitespace.line + '\n'
 
     def save(self) -> Dict:
         """Return a dict representing the Collection's contents"""
@@ -46,6 +119,95 @@ class BaseCollection(object):
     def _modify(self, field: str, value: str):
         setattr(self, field, value)
 
+    def _track(self, item: Any) -> None:
+        """Register `item` in the collection's lookup indexes."""
+        self._by_name[item.name] = item
+        if self._trigrams is not None:
+            self._trigrams.add(item)
+
+    def _untrack(self, item: Any) -> None:
+        """Remove `item` from the collection's lookup indexes."""
+        self._by_name.pop(item.name, None)
+        if self._trigrams is not None:
+            self._trigrams.discard(item)
+
+    def _trigram_index(self) -> TrigramIndex:
+        """Return the index of item names by trigram, it is built on first use and kept in sync afterwards."""
+        if self._trigrams is None:
+            index = TrigramIndex()
+            for item in self.items:
+                index.add(item)
+            self._trigrams = index
+        return self._trigrams
+
+    def _insert(self, item: Any) -> None:
+        self._load()
+        self._sequence[item] = next(self._counter)
+        if self._items is not None:
+            self._items.append(item)
+        self._track(item)
+
+    def _delete(self, item: Any) -> None:
+        self._load()
+        self._untrack(item)
+        del self._sequence[item]
+        self._items = None
+
+    def _set(self, item: Any, field: str, value: str) -> None:
+        self._untrack(item)
+        try:
+            item._modify(field, value)
+        finally:
+            # a value `_modify` cannot parse leaves the item as it was, it must stay tracked
+            self._track(item)
+
+    def _new_item(self, data: Any) -> Any:
+        """Create an item from the output of its `save()`, must be implemented by a child class."""
+        raise NotImplementedError
+
+    @property
+    def dirty(self) -> bool:
+        """Whether the collection changed since it was loaded or `mark_clean` was called"""
+        return self._dirty
+
+    def mark_clean(self) -> None:
+        self._dirty = False
+
+    def _record(self, action: str, *args: Any) -> None:
+        """Append a change to the journal, if there is one."""
+        self._dirty = True
+        if self.journal is not None:
+            self.journal.append([action, self.name, *args])
+
+    def _apply(self, action: str, *args: Any) -> bool:
+        """
+        Redo a change written by `_record`, silently. Return False if it does not fit the collection.
+
+        Records hold the resulting values (except `play` records of BoardGameCollections, which hold an increment)
+        and conflicting records are skipped, so replaying records that are already part of the collection
+        leaves it unchanged.
+        """
+        self._load()
+        if action == 'add':
+            item = self._new_item(args[0])
+            if item.name in self._by_name:
+                return False
+            self._insert(item)
+        elif action == 'remove':
+            item = self._by_name.get(args[0])
+            if item is None:
+                return False
+            self._delete(item)
+        elif action == 'edit':
+            name, field, value = args
+            item = self._by_name.get(name)
+            if item is None or (field == self.item_name_field and value != name and value in self._by_name):
+                return False
+            self._set(item, field, value)
+        else:
+            return False
+        return True
+
     def assert_item(self, key: Union[str, Any]) -> Any:
         """
         Make sure we get an item. If `key` is not an item, use get_item(key)
@@ -65,117 +227,434 @@ class BaseCollection(object):
 
     def get_item(self, key: str) -> Any:
         """Return the item at index `key` or with the name `key`"""
-        if key.isdigit():
+        self._load()
+        if is_number(key):
             if len(self.items) - 1 >= int(key):
                 return self.items[int(key)]
             else:
                 print('Error: index out of bounds.')
                 return None
         else:
-            item = next((item for item in self.items if item.name == key), None)
+            item = self._by_name.get(key)
             if not item:
                 print(f'Error: no item with the name `{key}` could be found.')
+                suggestions = self._trigram_index().search(key)
+                if suggestions:
+                    print(f'Info: did you mean: {", ".join(suggestion.name for suggestion in suggestions)}?')
             return item
 
-    def remove_item(self, item: Union[str, Any]) -> None:
+    def remove_item(self, item: Union[str, Any]) -> Optional[Failed]:
         """Remove an item from the collection."""
         item = self.assert_item(item)
-        if item:
-            self.items.remove(item)
-            print('Info: Successfully removed the item.')
+        if not item:
+            return FAILED
+        self._delete(item)
+        self._record('remove', item.name)
+        print('Info: Successfully removed the item.')
 
-    def add_item(self, item: Any) -> None:
+    def add_item(self, item: Any) -> Optional[Failed]:
         """Add an item to the collection. No duplicates are accepted."""
-        if not any(item.name == i.name for i in self.items):
-            self.items.append(item)
-            print('Info: Successfully added the item.')
-        else:
-            print('Info: Item already exists in collection.')
-
-    def edit_item(self, item: Union[str, Any], field: str, value: str) -> None:
+        self._load()
+        if item.name in self._by_name:
+            print(f'Error: an item with the name `{item.name}` already exists.')
+            return FAILED
+        self._insert(item)
+        self._record('add', item.save())
+        print('Info: Successfully added the item.')
+
+    def edit_item(self, item: Union[str, Any], field: str, value: str) -> Optional[Failed]:
         """Set an item's field `field` to `value`"""
         item = self.assert_item(item)
         if item and field in self.item_fields_check and self.item_fields_check[field](value):
-            item._modify(field, value)
+            if field == self.item_name_field and value != item.name and value in self._by_name:
+                print(f'Error: an item with the name `{value}` already exists.')
+                return FAILED
+            name = item.name
+            self._set(item, field, value)
+            self._record('edit', name, field, value)
             print(f'Info: Successfully set {field} to {value} for {item.name}')
         else:
             print('Error: invalid field(s) or value(s).')
+            return FAILED
 
 
 class BoardGameCollection(BaseCollection):
     """A manager for a collection of BoardGames"""
 
-    def __init__(self, name: str, items: List[BoardGame] = []):
+    def __init__(self,
+                 name: str,
+                 items: List[BoardGame] = [],
+                 *,
+                 loader: Optional[Callable[[], List[BoardGame]]] = None,
+                 count: int = 0,
+                 cache_size: int = QUERY_CACHE_SIZE,
+                 use_columnar: Optional[bool] = None,
+                 catalog: Optional[Catalog] = None):
+        # the metadata of the games is interned here by `_track`, the manager replaces it with its own catalog
+        self.catalog = catalog if catalog is not None else Catalog()
+        self._numeric_indexes = {field: SortedIndex(field, lambda item: self._sequence[item])
+                                 for field in BOARDGAME_NUMERIC_FIELDS}
+        # running counts, sums and histograms of the numeric fields, kept in sync by `_track` / `_untrack`
+        self._aggregates = CollectionAggregates()
+        # filters -> (stamp, exact, close), least recently used first. A stamp holds the generation
+        # of the collection (bumped on add/remove) and of each filtered field (bumped on edits)
+        self._query_cache: OrderedDict = OrderedDict()
+        # (field, reverse) -> (stamp, games), see `sorted_games`
+        self._sort_cache: Dict[Tuple[str, bool], Tuple[Tuple[int, int], List[BoardGame]]] = {}
+        self._cache_size = cache_size
+        self._cache_hits = self._cache_misses = 0
+        self._generation = 0
+        self._field_generation = {field: 0 for field in BOARDGAME_FIELD_CHECK}
+        # columnar backend: None uses it for large collections, if numpy is installed
+        self.use_columnar = use_columnar
+        self._columnar = None
+        self._columnar_stamp = None
         # NOTE BOARDGAME_FIELD_CHECK
-        super().__init__(name, items, item_fields_check=BOARDGAME_FIELD_CHECK)
-        self.header = (''
-                       + 'title'.ljust(30)
-                       + 'players'.rjust(5)
-                       + 'duration'.rjust(10)
-                       + 'recommended_age'.rjust(17)
-                       + 'times_played'.rjust(14)
-                       + 'rating'.rjust(8)
-                       + '\n')
+        super().__init__(name, items, item_fields_check=BOARDGAME_FIELD_CHECK, item_name_field='title',
+                         loader=loader, count=count)
+        self.header = BOARDGAME_HEADER + '\n'
+        self._index_header = 'index'.ljust(7) + self.header
 
     # -- overrides --
 
+    def _track(self, item: BoardGame) -> None:
+        item.info = self.catalog.intern(item.info, self)
+        super()._track(item)
+        for index in self._numeric_indexes.values():
+            index.add(item)
+        self._aggregates.add(item)
+
+    def _untrack(self, item: BoardGame) -> None:
+        super()._untrack(item)
+        for index in self._numeric_indexes.values():
+            index.discard(item)
+        self._aggregates.discard(item)
+        self.catalog.release(item.info, self)
+
+    def _insert(self, item: BoardGame) -> None:
+        super()._insert(item)
+        self._generation += 1
+
+    def _delete(self, item: BoardGame) -> None:
+        super()._delete(item)
+        self._generation += 1
+
+    def _set(self, item: BoardGame, field: str, value: str) -> None:
+        super()._set(item, field, value)
+        self._field_generation[field] += 1
+
     def assert_item(self, key: Union[str, BoardGame]) -> BoardGame:
         """override to set item-instance-type to `BoardGame`"""
         if isinstance(key, BoardGame):
-            if key in self.items:
+            if self._by_name.get(key.name) is key:
                 return key
             return None
         else:
             return self.get_item(key)
 
+    def _new_item(self, data: List[str]) -> BoardGame:
+        return BoardGame(*data)
+
+    def _apply(self, action: str, *args: Any) -> bool:
+        """Override to add the `play` action, it holds the increment of times_played so concurrent plays add up."""
+        if action == 'play':
+            self._load()
+            item = self._by_name.get(args[0])
+            if item is None:
+                return False
+            self._play(item, int(args[1]))
+            return True
+        return super()._apply(action, *args)
+
+    def _play(self, item: BoardGame, inc: int) -> None:
+        """Add to the times played of a game, only the times_played index and aggregate are updated."""
+        index = self._numeric_indexes['times_played']
+        aggregate = self._aggregates.fields['times_played']
+        index.discard(item)
+        aggregate.discard(item.times_played)
+        item.inc_times_played(inc)
+        index.add(item)
+        aggregate.add(item.times_played)
+        self._field_generation['times_played'] += 1
+
     # -- extensions --
 
-    def list_games(self, *filter_args: Optional[List[str, ]]) -> str:
+    def use_catalog(self, catalog: Catalog) -> None:
+        """Move the metadata of the games to `catalog`, the games of a lazy collection are interned when loaded."""
+        if catalog is self.catalog:
+            return
+        for item in self._sequence:
+            self.catalog.release(item.info, self)
+            item.info = catalog.intern(item.info, self)
+        self.catalog = catalog
+        # key by the interned titles, so the titles of the old catalog can be freed
+        self._by_name = {item.name: item for item in self._sequence}
+        self._trigrams = None
+
+    def list_games(self, *args: str) -> Union[Iterator[str], Failed]:
         """
-        Return a formatted string displaying the items in the collection.
+        Return a stream of lines displaying the items in the collection.
 
-        If filter_args are given, first show items that match the filter(s).
+        If filter args are given, first show items that match the filter(s).
         Then show items that partially matched the filter(s) below the
         exact results, separated by a line and sorted by relevance.
+        Numeric fields also accept an inclusive range, eg: duration 30..90
+        Similar titles and titles containing the value are close matches of a title, eg: title glomhaven
+
+        `sort field [asc|desc]` orders the rows by a field, `top n field` shows only the n games with the largest
+        values of a field, eg: top 10 times_played. With filters, the exact and close matches are ordered separately.
+
+        `page n` and `limit n` show only a part of the rows, eg: players 4 page 2 limit 20
         """
+        options, filter_args = split_options(args, LIST_OPTIONS)
+        for option, values in options.items():
+            if len(values) != LIST_OPTIONS[option]:
+                print(f'Error: {option} must be followed by {LIST_OPTION_VALUES[option]}.')
+                return FAILED
+        if not all(is_number(options[option][0]) and int(options[option][0]) > 0
+                   for option in ('page', 'limit', 'top') if option in options):
+            print('Error: page, limit and top must be followed by a positive number.')
+            return FAILED
+        limit = int(options['limit'][0]) if 'limit' in options else PAGE_SIZE if 'page' in options else None
+        start = (int(options['page'][0]) - 1) * limit if 'page' in options else 0
+        stop = None if limit is None else start + limit
+
+        top = int(options['top'][0]) if 'top' in options else None
+        field = options['top'][1] if 'top' in options else options['sort'][0] if 'sort' in options else None
+        reverse = 'desc' in options
+        if field is not None and field not in SORT_FIELDS:
+            print(f'Error: cannot sort by `{field}`, choose one of: {", ".join(SORT_FIELDS)}.')
+            return FAILED
+        if 'top' in options and 'sort' in options or ('asc' in options or 'desc' in options) and 'sort' not in options:
+            print('Error: use either sort field [asc|desc] or top n field.')
+            return FAILED
+
         if filter_args:
             filters = validate_filters(self.item_fields_check.keys(), *filter_args)
             if filters:
                 print(f'Debug (l_g): filters: {filters}')
-                return stringify_filter_results(self.header, *_filter(items=self.items, filters=filters))
+                exact, close = self.query(filters)
+                close_found = len(close)
+                if top is not None:
+                    exact = self._top(top, field, exact)
+                    close = self._top(top - len(exact), field, close)
+                elif field is not None:
+                    exact, close = self._sort(exact, field, reverse), self._sort(close, field, reverse)
+                return self._iter_page(iter_filter_results(self.header, exact, close, start, stop, close_found),
+                                       start, stop, len(exact) + len(close))
+
+        if field is not None:
+            games = self.top_games(top, field) if top is not None else self.sorted_games(field, reverse)
+            return self._iter_page(self._iter_rows(games, start, stop), start, stop, len(games))
 
         # no filter -> show index
-        return (Whitespace.clear
-                + 'index'.ljust(7) + self.header
-                + '\n'.join([f'{str(i).ljust(7)}{str(item)}' for i, item in enumerate(self.items)])
-                + '\n')
+        return self._iter_page(self._iter_index(start, stop), start, stop, len(self.items))
+
+    def sorted_games(self, field: str, reverse: bool = False) -> List[BoardGame]:
+        """
+        Return every game ordered by `field`, games without a value (eg. unrated) last.
+
+        Equal values keep the collection order. The result is cached until the collection or the field changes.
+        """
+        stamp = (self._generation, self._field_generation[field])
+        cached = self._sort_cache.get((field, reverse))
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        index = self._numeric_indexes.get(field)
+        if index is None:
+            games = self._sort(self.items, field, reverse)
+        else:
+            # the index is sorted by field already, sorting it again only orders equal values (nearly linear)
+            games = sorted(index, key=self._sort_key(field, reverse), reverse=reverse)
+            games += [item for item in self.items if getattr(item, field) is None]
+        self._sort_cache[(field, reverse)] = (stamp, games)
+        return games
+
+    def top_games(self, n: int, field: str) -> List[BoardGame]:
+        """Return the `n` games with the largest values of `field`, largest first, ties in collection order."""
+        index = self._numeric_indexes.get(field)
+        return self._top(n, field, self.items if index is None else index.largest(n))
+
+    def _sort_key(self, field: str, reverse: bool) -> Callable[[BoardGame], Tuple[Any, int]]:
+        # the insertion number keeps equal values in collection order, it is negated when sorting in reverse
+        sequence = self._sequence
+        if reverse:
+            return lambda item: (getattr(item, field), -sequence[item])
+        return lambda item: (getattr(item, field), sequence[item])
+
+    def _sort(self, games: List[BoardGame], field: str, reverse: bool) -> List[BoardGame]:
+        """Order `games` by `field`, games without a value last."""
+        ordered = sorted((item for item in games if getattr(item, field) is not None),
+                         key=self._sort_key(field, reverse), reverse=reverse)
+        return ordered + [item for item in games if getattr(item, field) is None]
+
+    def _top(self, n: int, field: str, games: Iterable[BoardGame]) -> List[BoardGame]:
+        """Select the `n` games with the largest values of `field` with a heap, without sorting all `games`."""
+        if n <= 0:
+            return []
+        return heapq.nlargest(n, (item for item in games if getattr(item, field) is not None),
+                              key=self._sort_key(field, True))
+
+    def query(self, filters: List[Tuple[str, str]]) -> Tuple[List[BoardGame], List[BoardGame]]:
+        """
+        Return the exact and close matches of `filters` (see `app.filters._filter`).
 
-    def add_game(self, *args) -> None:
+        Results are cached (LRU) until a game is added or removed, or a field used by the filters is edited.
+        """
+        key = tuple(sorted(filters))
+        stamp = (self._generation, tuple(self._field_generation.get(field, 0) for field, _ in key))
+        cached = self._query_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            self._query_cache.move_to_end(key)
+            self._cache_hits += 1
+            metrics.count('query cache hits')
+            return cached[1], cached[2]
+
+        self._cache_misses += 1
+        metrics.count('query cache misses')
+        # the trigram index is only built once titles are filtered
+        titles = self._trigram_index() if any(field == 'title' for field, _ in filters) else None
+        if self._columnar_enabled():
+            exact, close = self._columnar_table().filter(filters, titles)
+        else:
+            indexes = {'title': titles, **self._numeric_indexes} if titles is not None else self._numeric_indexes
+            exact, close = _filter(items=self.items, filters=filters, indexes=indexes, order=self._sequence)
+        if self._cache_size > 0:
+            self._query_cache[key] = (stamp, exact, close)
+            self._query_cache.move_to_end(key)
+            if len(self._query_cache) > self._cache_size:
+                self._query_cache.popitem(last=False)
+        return exact, close
+
+    def _columnar_enabled(self) -> bool:
+        if self.use_columnar is None:
+            return self.size >= columnar.COLUMNAR_THRESHOLD and columnar.available()
+        return self.use_columnar and columnar.available()
+
+    def _columnar_table(self) -> 'columnar.ColumnarTable':
+        """Return the columnar copy of the games, rebuilt if the collection changed since it was made"""
+        stamp = (self._generation, tuple(self._field_generation.values()))
+        if self._columnar is None or self._columnar_stamp != stamp:
+            self._columnar = columnar.ColumnarTable(self.items)
+            self._columnar_stamp = stamp
+        return self._columnar
+
+    @property
+    def aggregates(self) -> CollectionAggregates:
+        """The running aggregates of the games (see `app.aggregates`)"""
+        self._load()
+        return self._aggregates
+
+    def statistics(self) -> str:
+        """Return the number of games and the count, total, mean, min, max and histogram of each numeric field"""
+        return self.aggregates.report(f'Collection {self.name}')
+
+    def check_consistency(self) -> bool:
+        """Recompute the aggregates from scratch, return whether the running aggregates are equal to them"""
+        return CollectionAggregates(self.items) == self.aggregates
+
+    def cache_info(self) -> QueryCacheInfo:
+        """Return the hit and miss counts and the size of the query cache"""
+        return QueryCacheInfo(self._cache_hits, self._cache_misses, self._cache_size, len(self._query_cache))
+
+    def _iter_index(self, start: int, stop: Optional[int]) -> Iterator[str]:
+        yield Whitespace.clear
+        yield self._index_header
+        for i, item in enumerate(self.items[start:stop], start=start):
+            yield f'{i:<7}{item}\n'
+
+    def _iter_rows(self, games: List[BoardGame], start: int, stop: Optional[int]) -> Iterator[str]:
+        yield Whitespace.clear
+        yield self.header
+        for item in games[start:stop]:
+            yield f'{item}\n'
+
+    def _iter_page(self, lines: Iterator[str], start: int, stop: Optional[int], total: int) -> Iterator[str]:
+        yield from lines
+        if stop is not None and start >= total:
+            yield f'no rows on this page, there are {total} rows\n'
+        elif stop is not None:
+            yield f'rows {start + 1}-{min(stop, total)} of {total}\n'
+        yield '\n'
+
+    def add_game(self, *args) -> Optional[Failed]:
         """Crate a BoardGame instance and add it to the collection"""
         fields = list(self.item_fields_check.keys())
         checks = {fields[i]: arg for i, arg in enumerate(args)}
         if all(self.item_fields_check[field](value) for field, value in checks.items()):
-            self.add_item(BoardGame(*args))
-        else:
-            print('Error: Failed to add game, invalid argument type(s).')
+            return self.add_item(BoardGame(*args))
+        print('Error: Failed to add game, invalid argument type(s).')
+        return FAILED
+
+    def import_games(self, path: str) -> Optional[Failed]:
+        """
+        Add every game in a .csv (with a header row) or .jsonl file to the collection.
 
-    def play_game(self, item: BoardGame) -> None:
+        The file is streamed and the games are inserted in batches, records that are invalid
+        or have a title that is already in the collection are skipped.
+        """
+        p = Path(path)
+        if p.suffix.lower() not in bulk.FORMATS or not p.is_file():
+            print(f'Error: `{path}` is not a {"/".join(bulk.FORMATS)} file.')
+            return FAILED
+        self._load()
+        imported = duplicates = invalid = 0
+        try:
+            for batch in bulk.batches(bulk.parse_games(bulk.read_records(p))):
+                for game in batch:
+                    if game is None:
+                        invalid += 1
+                    elif game.name in self._by_name:
+                        duplicates += 1
+                    else:
+                        self._insert(game)
+                        self._record('add', game.save())
+                        imported += 1
+        except bulk.FILE_ERRORS as e:
+            print(f'Error: could not read `{path}` ({e}), imported {imported} games before the error.')
+            return FAILED
+        print(f'Info: Imported {imported} games, skipped {duplicates} duplicates and {invalid} invalid records.')
+
+    def export_games(self, path: str) -> Optional[Failed]:
+        """Write every game in the collection to a .csv or .jsonl file"""
+        p = Path(path)
+        if p.suffix.lower() not in bulk.FORMATS:
+            print(f'Error: `{path}` is not a {"/".join(bulk.FORMATS)} file.')
+            return FAILED
+        try:
+            written = bulk.write_games(p, self.items)
+        except bulk.FILE_ERRORS as e:
+            print(f'Error: could not write `{path}` ({e}).')
+            return FAILED
+        print(f'Info: Exported {written} games to {p}.')
+
+    def play_game(self, item: BoardGame) -> Optional[Failed]:
         """Register that a game (item) has been played"""
         item = self.assert_item(item)
-        if item:
-            item.inc_times_played()
-            print(f'Info: You played the game, total times played: {item.times_played}')
+        if not item:
+            return FAILED
+        self._play(item, 1)
+        self._record('play', item.name, 1)
+        print(f'Info: You played the game, total times played: {item.times_played}')
 
     # -- shortcuts / aliases --
 
-    def rate_game(self, game: Union[str, BoardGame], rating: str) -> None:
-        self.edit_item(game, 'rating', rating)
+    def rate_game(self, game: Union[str, BoardGame], rating: str) -> Optional[Failed]:
+        return self.edit_item(game, 'rating', rating)
+
+    def edit_game(self, game: Union[str, BoardGame], field: str, value: str) -> Optional[Failed]:
+        return self.edit_item(game, field, value)
 
 
 class CollectionManager(BaseCollection):
     """A manager for a collection of BoardGameCollections"""
 
-    def __init__(self, active: BoardGameCollection = None, items: List[BoardGameCollection] = []):
+    def __init__(self,
+                 active: BoardGameCollection = None,
+                 items: List[BoardGameCollection] = [],
+                 catalog: Optional[Catalog] = None):
+        # game metadata shared by all collections, see `app.catalog.Catalog`
+        self.catalog = catalog if catalog is not None else Catalog()
         # NOTE BOARDGAME_COLLECTION_FIELD_CHECK
         super().__init__('manager', items, item_fields_check=BOARDGAME_COLLECTION_FIELD_CHECK)
         self.active = active
@@ -184,41 +663,207 @@ class CollectionManager(BaseCollection):
     # -- overrides --
 
     def __str__(self) -> str:
-        return '\n'.join((str(item) for item in self.items))
+        """List the collections by name and size, without loading their items."""
+        return self.listing(self.active)
+
+    def listing(self, active: Optional[BoardGameCollection]) -> str:
+        """List the collections by name and size, marking `active` as the active collection."""
+        title = Whitespace.big_title('Collections')
+        header = 'index'.ljust(7) + 'name'.ljust(40) + 'games'.rjust(10)
+        text = '\n'.join(f'{i}'.ljust(7) + str_sized(item.name, 39).ljust(40) + f'{item.size}'.rjust(10)
+                         + ('  (active)' if item is active else '')
+                         for i, item in enumerate(self.items))
+        return (title + Whitespace.line + header + Whitespace.weak_line + text + Whitespace.line + '\n')
 
     def assert_item(self, key: Union[str, BoardGameCollection]) -> BoardGameCollection:
         """override to set item-instance-type to `BoardGameCollection`"""
         if isinstance(key, BoardGameCollection):
-            if key in self.items:
+            if self._by_name.get(key.name) is key:
                 return key
             else:
                 return None
         else:
             return self.get_item(key)
 
-    def remove_item(self, item: Any) -> None:
+    def _track(self, item: BoardGameCollection) -> None:
+        super()._track(item)
+        item.journal = self.journal
+        item.use_catalog(self.catalog)
+
+    def _delete(self, item: BoardGameCollection) -> None:
+        """Override, a removed collection takes its games out of the manager's catalog."""
+        super()._delete(item)
+        item.use_catalog(Catalog())
+
+    def _new_item(self, data: Dict) -> BoardGameCollection:
+        return BoardGameCollection(data['name'], [BoardGame(*args) for args in data['items']], catalog=self.catalog)
+
+    def save(self) -> Dict:
+        """
+        Override, the metadata of every distinct game is saved once in `catalog`.
+
+        The games of a collection are saved as [catalog position, times_played, rating].
+        """
+        entries, positions = number_entries(self.items)
+        return {
+            'name': self.name,
+            'catalog': [[info.title, str(info.players), str(info.duration), str(info.recommended_age)]
+                        for info in entries],
+            'items': [{'name': item.name, 'items': [[positions[id(game.info)], str(game.times_played),
+                                                     '' if game.rating is None else str(game.rating)]
+                                                    for game in item.items]}
+                      for item in self.items]
+        }
+
+    @property
+    def dirty(self) -> bool:
+        """Override, the manager is dirty if it or any of its collections changed."""
+        return self._dirty or any(item.dirty for item in self._sequence)
+
+    def mark_clean(self) -> None:
+        """Override to mark the collections clean as well."""
+        self._dirty = False
+        for item in self._sequence:
+            item.mark_clean()
+
+    def _record(self, action: str, *args: Any) -> None:
+        """Override, records of the manager itself are made with `None` in place of a collection name."""
+        self._dirty = True
+        if self.journal is not None:
+            self.journal.append([action, None, *args])
+
+    def _apply(self, action: str, *args: Any) -> bool:
+        """Override to add the `select` action and keep a base collection."""
+        if action == 'select':
+            item = self._by_name.get(args[0])
+            if item is None:
+                return False
+            self.active = item
+            return True
+        applied = super()._apply(action, *args)
+        self.reassure_base()
+        return applied
+
+    def remove_item(self, item: Any) -> Optional[Failed]:
         """Override to recreate base collection if all collections are deleted."""
-        super().remove_item(item)
+        failed = super().remove_item(item)
         self.reassure_base()
+        return failed
 
-    def add_item(self, name: str) -> None:
+    def add_item(self, name: str) -> Optional[Failed]:
         """override to make the item object a `BoardGameCollection`"""
-        super().add_item(BoardGameCollection(name))
+        return super().add_item(BoardGameCollection(name, catalog=self.catalog))
 
     # -- extensions --
 
     def reassure_base(self) -> None:
         if not self.items:
-            self.items.append(BoardGameCollection('base'))
+            self._insert(BoardGameCollection('base', catalog=self.catalog))
         if not self.active:
             self.active = self.items[0]
 
-    def select_active(self, item: BoardGameCollection) -> None:
+    def select_active(self, item: BoardGameCollection) -> Optional[Failed]:
         item = self.assert_item(item)
-        if item:
-            self.active = item
+        if not item:
+            return FAILED
+        item._load()
+        self.active = item
+        self._record('select', item.name)
+
+    def search(self, *args: str) -> Union[Iterator[str], Failed]:
+        """
+        Filter the games in every collection, eg: players 4 duration 0..60
+
+        Return a stream of lines showing the exact, then the close matches of all collections, each listed
+        with the name of its collection. `workers n` sets the number of processes used for large collections.
+        """
+        options, filter_args = split_options(args, SEARCH_OPTIONS)
+        workers = options.get('workers', ['0'])
+        if len(workers) != 1 or not is_number(workers[0]):
+            print('Error: workers must be followed by a number.')
+            return FAILED
+        filters = validate_filters(BOARDGAME_FIELD_CHECK.keys(), *filter_args)
+        if not filters:
+            print('Error: no valid filters given.')
+            return FAILED
+        exact, close = search_collections(self.items, filters, int(workers[0]) or None)
+        return itertools.chain(iter_filter_results('collection'.ljust(20) + BOARDGAME_HEADER + '\n', exact, close),
+                               ('\n',))
+
+    def find_game(self, *words: str) -> Optional[str]:
+        """
+        List the collections holding a game, eg: f gloomhaven
+
+        The catalog knows the collections of a title, lazy collections are loaded the first time.
+        """
+        title = ' '.join(words)
+        for item in self.items:
+            item._load()
+        found = self.find(title)
+        if not found:
+            print(f'Info: no collection holds `{title}`.')
+            return None
+        header = 'collection'.ljust(20) + BOARDGAME_HEADER
+        text = '\n'.join(str(SearchResult(item, game)) for item, game in found)
+        return Whitespace.line + header + Whitespace.weak_line + text + Whitespace.line + '\n'
+
+    def find(self, title: str) -> List[Tuple[BoardGameCollection, BoardGame]]:
+        """Return the (collection, game) pairs of the loaded collections holding a game titled `title`"""
+        return [(item, item._by_name[title]) for item in self.catalog.owners(title)]
+
+    def statistics(self) -> str:
+        """Return the aggregates of all collections combined, see `BoardGameCollection.statistics`"""
+        rollup = CollectionAggregates.rollup(item.aggregates for item in self.items)
+        return rollup.report(f'All {len(self.items)} collections')
+
+    def check_consistency(self) -> bool:
+        """Return whether the running aggregates of every collection match a recomputation"""
+        return all(item.check_consistency() for item in self.items)
+
+    def stats(self) -> str:
+        """Return the timings and counters collected by `app.metrics` and the query cache use per collection."""
+        lines = [metrics.report(), '', 'collection'.ljust(28) + 'hits'.rjust(8) + 'misses'.rjust(8) + 'cached'.rjust(8)]
+        for item in self.items:
+            if item.loaded:
+                info = item.cache_info()
+                lines.append(f'{item.name:<28.27}{info.hits:>8}{info.misses:>8}{info.currsize:>8}')
+        return '\n'.join(lines) + '\n'
+
+    def reload(self, other: 'CollectionManager') -> None:
+        """Take over the collections of `other`, eg. the manager read again after another process saved it."""
+        active = self.active.name if self.active else None
+        for item in list(self._sequence):
+            self._delete(item)
+        self.catalog = other.catalog
+        for item in other.items:
+            self._insert(item)
+        self.active = self._by_name.get(active)
+        self.reassure_base()
+
+    def attach_journal(self, journal: Any) -> None:
+        """Record all further changes to the manager and its collections in `journal`."""
+        self.journal = journal
+        for item in self.items:
+            item.journal = journal
+
+    def replay(self, records: Iterable[List]) -> Tuple[int, int]:
+        """Apply journal records to the manager and its collections, return the applied and skipped count."""
+        applied = skipped = 0
+        for record in records:
+            if self._replay_record(*record):
+                applied += 1
+            else:
+                skipped += 1
+        return applied, skipped
+
+    def _replay_record(self, action: str, name: Optional[str], *args: Any) -> bool:
+        target = self if name is None else self._by_name.get(name)
+        try:
+            return target is not None and target._apply(action, *args)
+        except (TypeError, ValueError, KeyError, IndexError):
+            return False
 
     # -- shortcuts / aliases --
 
-    def change_collection_name(self, item: Union[str, BoardGameCollection], name: str) -> None:
-        self.edit_item(item, 'name', name)
+    def change_collection_name(self, item: Union[str, BoardGameCollection], name: str) -> Optional[Failed]:
+        return self.edit_item(item, 'name', name)
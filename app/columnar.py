@@ -0,0 +1,98 @@
+"""
+Optional columnar filter backend, used when numpy is installed.
+
+The games of a collection are copied into one array per field and the filters are evaluated
+as vectorized masks. Results are identical to `app.filters._filter`.
+"""
+import logging
+from functools import lru_cache
+from typing import List, Tuple, Any, Optional
+
+from app.boardgame import BOARDGAME_NUMERIC_FIELDS
+from app.filters import _compile_filters
+from app.indexes import TrigramIndex, similarity, is_close
+
+# numpy is imported by `available`, the first time a collection is large enough to use it
+np = None
+
+log = logging.getLogger(__name__)
+
+# collections with at least this many games use the columnar backend (if numpy is installed)
+COLUMNAR_THRESHOLD = 50000
+
+
+@lru_cache(maxsize=None)
+def available() -> bool:
+    global np
+    try:
+        import numpy as np
+    except ImportError:
+        return False
+    return True
+
+
+class ColumnarTable(object):
+    """The games of a collection as arrays, a snapshot that must be rebuilt when the collection changes"""
+
+    def __init__(self, items: List[Any]):
+        if not available():
+            raise ImportError('the columnar backend requires numpy')
+        self.items = list(items)
+        self.positions = {item: i for i, item in enumerate(self.items)}
+        self.titles = np.array([item.title for item in self.items], dtype=object)
+        # field -> (values, present), unset values (eg. rating) are stored as 0 and masked out by `present`
+        self.columns = {}
+        for field in BOARDGAME_NUMERIC_FIELDS:
+            values = [getattr(item, field) for item in self.items]
+            present = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+            self.columns[field] = (np.fromiter((value or 0 for value in values), dtype=np.int64, count=len(values)),
+                                   present)
+
+    def filter(self,
+               filters: List[Tuple[str, str]],
+               titles: Optional[TrigramIndex] = None) -> Tuple[List[Any], List[Any]]:
+        """
+        Return the exact and close matches, in the same order as `app.filters._filter`
+
+        Close title matches are looked up in `titles` (an index of the same games) if given, else every title is scored.
+        """
+        compiled = _compile_filters(filters)
+        size = len(self.items)
+        matches = np.zeros(size, dtype=np.int64)
+        distance = np.zeros(size, dtype=np.float64)
+        exact = np.ones(size, dtype=bool)
+        for field, low, high, margin in compiled:
+            if isinstance(margin, float):
+                hit = self.titles == low
+                delta = np.zeros(size, dtype=np.float64)
+                for item in (self.items if titles is None else titles.lookup(low, margin)):
+                    if item.title != low:
+                        score = similarity(low, item.title)
+                        if is_close(low, item.title, score, margin):
+                            i = self.positions[item]
+                            hit[i] = True
+                            delta[i] = 2 - score
+                matches += hit
+                distance += delta
+                exact &= hit & (delta == 0)
+            elif margin is None:
+                if field == 'title':
+                    hit = self.titles == low
+                else:
+                    # a non-numeric value never equals a number (or an unset value)
+                    hit = np.zeros(size, dtype=bool)
+                matches += hit
+                exact &= hit
+            else:
+                values, present = self.columns[field]
+                delta = np.where(values < low, low - values, np.maximum(values - high, 0))
+                hit = present & (delta <= margin)
+                matches += hit
+                distance += np.where(hit, delta, 0)
+                exact &= hit & (delta == 0)
+
+        close = np.flatnonzero((matches > 0) & ~exact)
+        # rank by match count (descending), distance, position; lexsort sorts by the last key first
+        close = close[np.lexsort((close, distance[close], -matches[close]))]
+        items = self.items
+        return [items[i] for i in np.flatnonzero(exact).tolist()], [items[i] for i in close.tolist()]
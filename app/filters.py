@@ -1,14 +1,20 @@
 import logging
-from typing import Tuple, List, Any
+from typing import Tuple, List, Dict, Set, Any, Optional, Iterator, Sequence
+
+from app import metrics
+from app.indexes import similarity, is_close
+from app.utils import is_number
 
 log = logging.getLogger(__name__)
 
 
+# numeric fields: the largest distance of a close match (int)
+# text fields: the least trigram similarity of a close match (float), see `app.indexes.similarity`
 FILTER_MARGINS = {
     # Collection
     'name': '',
     # BoardGame
-    'title': '',
+    'title': 0.5,
     'players': 2,
     'duration': 4,
     'recommended_age': 3,
@@ -20,71 +26,195 @@ FILTER_MARGINS = {
 def validate_filters(fields: List[str], *filter_args: List[str]) -> List[Tuple[str, str]]:
     """Construct a list of valid filter tuples (field, value) from a list of valid fields and user input."""
     filters = []
-    log.trace('Enter `validate_filters(fields, *filter_args)` with '
-              f'fields: {fields}, filter_args: {filter_args}')
+    log.trace('Enter `validate_filters(fields, *filter_args)` with fields: %s, filter_args: %s', fields, filter_args)
 
     # TODO add examples
 
     for j, i in enumerate(range(0, len(filter_args), 2), start=1):
         try:
-            log.trace(f'Trying filter construction {j}...')
+            log.trace('Trying filter construction %d...', j)
             field = filter_args[i]
             value = filter_args[i+1]
-            log.trace(f'Aquired field: {field}, value: {value}')
+            log.trace('Aquired field: %s, value: %s', field, value)
             if any(field in f[0] for f in filters):
                 print('Warning: Cannot have more than 1 filter per field!')
                 print(f'Info: denied filter: ({field}, {value})')
                 continue
             elif field in fields:
                 filters.append((field, value))
-                log.trace(f'Added to filters, filters is now: {filters}')
+                log.trace('Added to filters, filters is now: %s', filters)
             else:
                 print(f'Debug (v_f): invalid field {field}')
         except IndexError as e:
-            log.trace(f'Filter construction failed during iteration {j}.')
+            log.trace('Filter construction failed during iteration %d.', j)
             print(f'Debug (v_f): {e}')
             break
     return filters
 
 
-def _filter(items: List[Any], filters: List[Tuple[str, str]]) -> Tuple[List[Any], List[Any]]:
-    """Apply a sequence of filters on a sequence of objects, return the exact- and close matches"""
-    # 1. exact matches: iteratively filter out the intersection of all items and the matches
-    exact_matches = set(items)
-    for field, value in filters:
-        exact_matches &= {item for item in items if getattr(item, field) == value}
-
-    # 2. close matches:
-    #       partial matches (matches that only match some fields)
-    #       marginal matches (fields with margin match within it)
-    # 2.1. Get ALL matches against the items not included in `exact matches`
-    all_close_matches = []
-    remaining_items = list(set(items) - exact_matches)
+def _compile_filters(filters: List[Tuple[str, str]]) -> List[Tuple[str, Any, Any, Optional[int]]]:
+    """
+    Parse filter values once into (field, low, high, margin) tuples.
+
+    Numeric fields accept a single value or an inclusive range `low..high`.
+    Text fields with a similarity margin (a float) also match similar texts, `low` is the text.
+    Other fields (or a non-numeric value for a numeric field) are exact-only,
+    for those `margin` is None and `low` is the value to compare against.
+    """
+    compiled = []
     for field, value in filters:
-        if isinstance(FILTER_MARGINS[field], str):
-            all_close_matches += [item for item in remaining_items if getattr(item, field) == value]
+        margin = FILTER_MARGINS.get(field, '')
+        low, _, high = value.partition('..')
+        if isinstance(margin, int) and is_number(low) and (is_number(high) or not high):
+            low, high = sorted((int(low), int(high or low)))
+            compiled.append((field, low, high, margin))
+        elif isinstance(margin, float):
+            compiled.append((field, value, value, margin))
+        else:
+            compiled.append((field, value, value, None))
+    return compiled
+
+
+def _score(item: Any, compiled: List[Tuple[str, Any, Any, Optional[int]]]) -> Tuple[int, float]:
+    """
+    Return how many filters `item` matches (within margin) and the summed distance of those matches.
+
+    A close text match adds a distance of 2 - similarity, so it is never mistaken for an exact match.
+    """
+    matches = distance = 0
+    for field, low, high, margin in compiled:
+        current = getattr(item, field)
+        if margin is None:
+            if current == low:
+                matches += 1
+        elif isinstance(margin, float):
+            if current == low:
+                matches += 1
+            else:
+                score = similarity(low, current)
+                if is_close(low, current, score, margin):
+                    matches += 1
+                    distance += 2 - score
+        elif current is not None:
+            delta = low - current if current < low else max(current - high, 0)
+            if delta <= margin:
+                matches += 1
+                distance += delta
+    return matches, distance
+
+
+def _candidates(compiled: List[Tuple[str, Any, Any, Optional[int]]], indexes: Dict[str, Any]) -> Optional[Set[Any]]:
+    """
+    Collect every item matching at least one filter using the `indexes`, or None if a filter has no index.
+
+    `indexes` maps a field to either a dict (value -> item) for exact-only fields,
+    an `app.indexes.TrigramIndex` for text fields or an `app.indexes.SortedIndex` for numeric fields.
+    """
+    candidates = set()
+    for field, low, high, margin in compiled:
+        index = indexes.get(field)
+        if index is None:
+            return None
+        if margin is None:
+            if isinstance(index, dict):
+                if low in index:
+                    candidates.add(index[low])
+            else:
+                return None
+        elif isinstance(margin, float):
+            candidates.update(index.lookup(low, margin))
+        else:
+            candidates.update(index.range(low - margin, high + margin))
+    return candidates
+
+
+def _filter(items: List[Any],
+            filters: List[Tuple[str, str]],
+            indexes: Optional[Dict[str, Any]] = None,
+            order: Optional[Dict[Any, int]] = None) -> Tuple[List[Any], List[Any]]:
+    """
+    Apply a sequence of filters on a sequence of objects, return the exact- and close matches.
+
+    Every item is scored once against all filters. Exact matches keep the order of `items`,
+    close matches (items matching some filters, or matching within `FILTER_MARGINS`) are ranked
+    by match count (descending), then total distance (ascending), then their order in `items`.
+
+    If `indexes` (see `_candidates`) and `order` (item -> relative position in `items`) are given,
+    only the items the indexes return are scored instead of scanning all `items`.
+    """
+    with metrics.span('filter'):
+        compiled = _compile_filters(filters)
+        candidates = _candidates(compiled, indexes) if compiled and indexes and order is not None else None
+        if candidates is None:
+            scanned = enumerate(items)
+            metrics.count('items scanned', len(items))
         else:
-            all_close_matches += [item for item in remaining_items
-                                  if abs(int(getattr(item, field)) - int(value)) <= FILTER_MARGINS[field]]
-    # 2.2. Sort by match count
-    match_count = {}
-    for item in set(all_close_matches):
-        match_count[all_close_matches.count(item)] = item
-    close_matches = [v for k, v in sorted(match_count.items(), key=lambda item: item[0])]
+            scanned = sorted((order[item], item) for item in candidates)
+            metrics.count('items scanned', len(candidates))
 
-    return exact_matches, close_matches  # NOTE actually `close_matches` is a list of str, not a list of Any
+        exact_matches = []
+        close_matches = []
+        for position, item in scanned:
+            matches, distance = _score(item, compiled)
+            if matches == len(compiled) and not distance:
+                exact_matches.append(item)
+            elif matches:
+                close_matches.append((-matches, distance, position, item))
+        close_matches.sort(key=lambda entry: entry[:3])
+        return exact_matches, [entry[-1] for entry in close_matches]
 
 
 def stringify_filter_results(header: str, exact_result: List[Any], close_result: List[Any]) -> str:
     """Creates and returns a nice display format string for the results from a `_filter` call"""
+    return ''.join(iter_filter_results(header, exact_result, close_result))
+
+
+def iter_filter_results(header: str,
+                        exact_result: List[Any],
+                        close_result: List[Any],
+                        start: int = 0,
+                        stop: Optional[int] = None,
+                        close_found: Optional[int] = None) -> Iterator[str]:
+    """
+    Stream the display format of the results from a `_filter` call, row by row.
+
+    `start` and `stop` select a part of the results, counting the exact results first, then the close results.
+    `close_found` is the number of close results found when `close_result` holds only some of them (eg. the top n),
+    there is no placeholder for missing close matches then.
+    """
     line = '\n' + '---' * 30 + '\n'
     weak_line = '\n' + '-  ' * 30 + '\n'
-    if exact_result:
-        exact_text = '\n'.join(str(item) for item in (exact_result))
-    else:
-        exact_text = f'{"< no exact matches >":^80}'
-    if close_result:
-        close_text = '\n'.join(str(item) for item in (close_result))
-    else:
-        close_text = f'{"< no close matches >":^80}'
-    return line + header + weak_line + exact_text + weak_line + close_text + line
+    skipped = len(exact_result)
+    yield line + header + weak_line
+    yield from _iter_rows(exact_result[start:stop], '' if exact_result else '< no exact matches >')
+    yield weak_line
+    yield from _iter_rows(close_result[max(start - skipped, 0):None if stop is None else max(stop - skipped, 0)],
+                          '' if close_result or close_found else '< no close matches >')
+    yield line
+
+
+def _iter_rows(items: List[Any], placeholder: str) -> Iterator[str]:
+    if not items and placeholder:
+        yield f'{placeholder:^80}'
+    for i, item in enumerate(items):
+        yield f'\n{item}' if i else f'{item}'
+
+
+def split_options(args: Sequence[str], options: Dict[str, int]) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Separate options from filter arguments, eg: ['players', '4', 'page', '2'] -> {'page': ['2']}, ['players', '4']
+
+    `options` maps an option name to the number of values it takes, anything else is taken as (field, value) pairs.
+    """
+    found = {}
+    filter_args = []
+    i = 0
+    while i < len(args):
+        if args[i] in options:
+            size = options[args[i]]
+            found[args[i]] = list(args[i + 1:i + 1 + size])
+            i += 1 + size
+        else:
+            filter_args += args[i:i + 2]
+            i += 2
+    return found, filter_args
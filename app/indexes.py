@@ -0,0 +1,152 @@
+import heapq
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import List, Dict, Set, Tuple, FrozenSet, Iterator, Any, Optional, Callable
+
+
+# bits of an index key holding the insertion number, see `SortedIndex`
+SEQUENCE_BITS = 40
+
+
+class SortedIndex(object):
+    """
+    Secondary index keeping items sorted by a numeric field, then by insertion number.
+
+    The key of an item packs both into one int: value << SEQUENCE_BITS | insertion number (`sequence(item)`).
+    Keys are unique, so bisect finds the slot of an item directly even when many items share a value.
+
+    Items without a value for the field (eg. an unset rating) are not indexed,
+    they can never match a numeric filter anyway. An item must be discarded
+    *before* its field is modified (or its insertion number is forgotten), and added again afterwards.
+    """
+
+    def __init__(self, field: str, sequence: Callable[[Any], int]):
+        self.field = field
+        self._sequence = sequence
+        self._keys: List[int] = []
+        self._items: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _key(self, item: Any) -> Optional[int]:
+        value = getattr(item, self.field)
+        if value is None:
+            return None
+        return value << SEQUENCE_BITS | self._sequence(item)
+
+    def add(self, item: Any) -> None:
+        key = self._key(item)
+        if key is None:
+            return
+        i = bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self._items.insert(i, item)
+
+    def discard(self, item: Any) -> None:
+        key = self._key(item)
+        if key is None:
+            return
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+            del self._items[i]
+
+    def range(self, low: int, high: int) -> List[Any]:
+        """Return the items with `low <= field <= high`, sorted by field."""
+        return self._items[bisect_left(self._keys, low << SEQUENCE_BITS):
+                           bisect_left(self._keys, (high + 1) << SEQUENCE_BITS)]
+
+    def largest(self, n: int) -> List[Any]:
+        """Return the items with the `n` largest values, and every item tied with the n-th, sorted by field."""
+        if n <= 0 or not self._keys:
+            return []
+        value = self._keys[-min(n, len(self._keys))] >> SEQUENCE_BITS
+        return self._items[bisect_left(self._keys, value << SEQUENCE_BITS):]
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the items, sorted by field, equal values in insertion order."""
+        return iter(self._items)
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """The 3 character slices of `text`, padded so the start (and end) of a text count more"""
+    padded = f'  {text} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: str, b: str) -> float:
+    """Dice coefficient of the trigrams of `a` and `b`, from 0.0 (nothing shared) to 1.0"""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def is_close(value: str, text: str, score: float, threshold: float) -> bool:
+    """Whether `text` is a close match of `value`: similar enough (a typo) or containing it (3+ characters)"""
+    return score >= threshold or (len(value) >= 3 and value in text)
+
+
+class TrigramIndex(object):
+    """
+    Secondary index of items by the trigrams of their name, for substring and typo-tolerant lookups.
+
+    Like `SortedIndex`, an item must be discarded *before* it is renamed, and added again afterwards.
+    """
+
+    def __init__(self):
+        # trigram -> names containing it
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        # name -> (item, number of trigrams of the name)
+        self._items: Dict[str, Tuple[Any, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item: Any) -> None:
+        grams = trigrams(item.name)
+        self._items[item.name] = (item, len(grams))
+        for gram in grams:
+            self._postings[gram].add(item.name)
+
+    def discard(self, item: Any) -> None:
+        entry = self._items.get(item.name)
+        if entry is None or entry[0] is not item:
+            return
+        del self._items[item.name]
+        for gram in trigrams(item.name):
+            names = self._postings[gram]
+            names.discard(item.name)
+            if not names:
+                del self._postings[gram]
+
+    def scores(self, value: str, threshold: float) -> Dict[str, float]:
+        """Return name -> similarity of every name that is equal or close to `value` (see `is_close`)"""
+        grams = trigrams(value)
+        shared = Counter()
+        for gram in grams:
+            names = self._postings.get(gram)
+            if names:
+                shared.update(names)
+        # a name shares at most all of its own trigrams, so a similar name shares at least `least` of them.
+        # A name containing `value` shares every (unpadded) trigram inside `value`.
+        least = threshold * len(grams) / (2 - threshold) - 1e-9
+        if len(value) >= 3:
+            least = min(least, len({value[i:i + 3] for i in range(len(value) - 2)}))
+        items = self._items
+        scores = {}
+        for name, count in shared.items():
+            if count >= least:
+                score = 2 * count / (len(grams) + items[name][1])
+                if is_close(value, name, score, threshold):
+                    scores[name] = score
+        return scores
+
+    def lookup(self, value: str, threshold: float) -> List[Any]:
+        """Return the items with a name equal or close to `value`, in no particular order"""
+        items = self._items
+        return [items[name][0] for name in self.scores(value, threshold)]
+
+    def search(self, value: str, threshold: float = 0.3, limit: int = 3) -> List[Any]:
+        """Return up to `limit` items with a name close to `value`, most similar first"""
+        ranked = heapq.nsmallest(limit, self.scores(value, threshold).items(), key=lambda entry: (-entry[1], entry[0]))
+        return [self._items[name][0] for name, _ in ranked]
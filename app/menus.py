@@ -1,10 +1,11 @@
 # flake8: noqa
 
-from typing import Dict, Callable
+from typing import Dict, Callable, List, Set
 
 from app.utils import Whitespace
 
 #  NOTE ALWAYS pass the instance of `CollectionManager` as the first argument to menus' lambda-functions
+#  A command that failed prints its error and returns `app.utils.FAILED`
 
 
 class Menu(object):
@@ -12,6 +13,8 @@ class Menu(object):
     title: str
     instructions: str
     choices: Dict[str, Callable]
+    # actions taking a path, their arguments keep their case (see `split_command`)
+    path_actions: Set[str] = set()
 
 
 class GameMenu(Menu):
@@ -21,22 +24,30 @@ class GameMenu(Menu):
   1 add boardgame             ::= 1 [title] [players] [duration] [recommended_age]
   2 remove boardgame          ::= 2 [title|index]
   3 modify boardgame          ::= 3 [title|index] [field] [new value]
-  4 list boardgames*          ::= 4
+  4 list boardgames*          ::= 4 [field value]... [sort field [asc|desc]] [top n field] [page n] [limit n]
   5 rate boardgame            ::= 5 [title|index] [rating]
   6 play boardgame            ::= 6 [title|index]
+  7 collection statistics     ::= 7
+  i import boardgames         ::= i [path.csv|path.jsonl]
+  e export boardgames         ::= e [path.csv|path.jsonl]
   - - - - - - - - - - - - - - - - -
   8 manage collections        ::= 8
   ? show help                 ::= ?
   0 exit                      ::= 0
 """
+    path_actions = {'i', 'e'}
     choices = {
             # action    arguments               execution                                     # return value
-            '1': lambda m, *args:               m.active.add_game(*args),                     # None
-            '2': lambda m, key:                 m.active.remove_item(key),                    # None
-            '3': lambda m, key, field, value:   m.active.edit_game(key, field, value),        # None
-            '4': lambda m, *args:               m.active.list_games(*args),                   # str
-            '5': lambda m, key, value:          m.active.edit_game(key, 'rating', value),     # None
-            '6': lambda m, key:                 m.active.play_game(key),                      # None
+            '1': lambda m, *args:               m.active.add_game(*args),                     # None or FAILED
+            '2': lambda m, key:                 m.active.remove_item(key),                    # None or FAILED
+            '3': lambda m, key, field, value:   m.active.edit_game(key, field, value),        # None or FAILED
+            '4': lambda m, *args:               m.active.list_games(*args),                   # Iterator[str] or FAILED
+            '5': lambda m, key, value:          m.active.edit_game(key, 'rating', value),     # None or FAILED
+            '6': lambda m, key:                 m.active.play_game(key),                      # None or FAILED
+            '7': lambda m:                      m.active.statistics(),                        # str
+            'i': lambda m, path:                m.active.import_games(path),                  # None or FAILED
+            'e': lambda m, path:                m.active.export_games(path),                  # None or FAILED
+            'stats': lambda m:                  m.stats(),                                    # str (not listed)
             # - - - - - - - - - - - - - - - - -
             '8': lambda m:                      CollectionMenu(),                             # Menu derived object
             '?': lambda m:                      GameMenu.instructions,                        # str
@@ -44,7 +55,7 @@ class GameMenu(Menu):
         }
 
 
-class CollectionMenu(object):
+class CollectionMenu(Menu):
     name = 'Manage Collections'
     title = Whitespace.big_title(name)
     instructions = """
@@ -53,6 +64,9 @@ class CollectionMenu(object):
   3 change collection name    ::= 3 [index|name] [new name]
   4 list all collections      ::= 4
   5 select active collection  ::= 5 [index|name]
+  6 search all collections*   ::= 6 [field value]... [workers n]
+  7 statistics of all         ::= 7
+  f find game in all          ::= f [title]
   - - - - - - - - - - - - - - - - -
   8 main menu                 ::= 8
   ? show help                 ::= ?
@@ -60,13 +74,25 @@ class CollectionMenu(object):
 """
     choices = {
             # action    arguments               execution                                     # return value
-            '1': lambda m, name:                m.add_item(name),                             # None
-            '2': lambda m, key:                 m.remove_item(key),                           # None
-            '3': lambda m, key, name:           m.edit_item(key, 'name', name),               # None
+            '1': lambda m, name:                m.add_item(name),                             # None or FAILED
+            '2': lambda m, key:                 m.remove_item(key),                           # None or FAILED
+            '3': lambda m, key, name:           m.edit_item(key, 'name', name),               # None or FAILED
             '4': lambda m:                      str(m),                                       # str
-            '5': lambda m, key:                 m.select_active(key),                         # None
+            '5': lambda m, key:                 m.select_active(key),                         # None or FAILED
+            '6': lambda m, *args:               m.search(*args),                              # Iterator[str] or FAILED
+            '7': lambda m:                      m.statistics(),                               # str
+            'f': lambda m, *words:              m.find_game(*words),                          # str
+            'stats': lambda m:                  m.stats(),                                    # str (not listed)
             # - - - - - - - - - - - - - - - - -
             '8': lambda m:                      GameMenu(),                                   # Menu derived object
             '?': lambda m:                      CollectionMenu.instructions,                  # str
             '0': lambda m:                      0,                                            # int
         }
+
+
+def split_command(menu: Menu, line: str) -> List[str]:
+    """Split a command line into the action and its arguments, lowercased except the paths of `menu.path_actions`"""
+    args = line.strip().split()
+    if args and args[0].lower() in menu.path_actions:
+        return [args[0].lower()] + args[1:]
+    return [arg.lower() for arg in args]
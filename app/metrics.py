@@ -0,0 +1,111 @@
+"""
+Timing spans, latency histograms and counters for the phases of the program (load, commands, filter, render, save).
+
+Instrumentation is off by default: `span` then returns a shared no-op context manager and `count` returns
+at once, so an instrumented phase costs about one function call. `enable` turns it on (see --profile).
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List
+
+enabled = False
+
+# upper bounds (inclusive, in milliseconds) of the histogram buckets, the last bucket holds everything slower
+BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+
+class Histogram(object):
+    """Latency histogram of a span, the bucket counts follow `BUCKETS`"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p: float) -> float:
+        """Return the upper bound of the bucket holding the p-th percentile (inf for the last bucket)"""
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+spans: Dict[str, Histogram] = defaultdict(Histogram)
+counters: Dict[str, int] = defaultdict(int)
+
+
+class _Span(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        spans[self.name].add((time.perf_counter() - self.start) * 1000)
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    """Time a phase: `with span('save'): ...`, the duration is added to the histogram of `name`."""
+    return _Span(name) if enabled else _NO_SPAN
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to the counter `name`."""
+    if enabled:
+        counters[name] += n
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def reset() -> None:
+    spans.clear()
+    counters.clear()
+
+
+def report() -> str:
+    """Return the span histograms and counters as a table."""
+    if not enabled:
+        return 'Info: instrumentation is off, start the program with --profile to collect timings.'
+    lines: List[str] = ['span'.ljust(28) + 'count'.rjust(8) + 'total ms'.rjust(12) + 'mean ms'.rjust(10)
+                        + 'p50 <='.rjust(9) + 'p95 <='.rjust(9) + 'max ms'.rjust(10)]
+    for name, histogram in sorted(spans.items()):
+        lines.append(f'{name:<28.27}{histogram.count:>8}{histogram.total:>12.1f}'
+                     f'{histogram.total / histogram.count:>10.2f}{histogram.percentile(50):>9}'
+                     f'{histogram.percentile(95):>9}{histogram.max:>10.1f}')
+    lines.append('')
+    lines.append('counter'.ljust(28) + 'value'.rjust(12))
+    lines.extend(f'{name:<28.27}{value:>12}' for name, value in sorted(counters.items()))
+    return '\n'.join(lines)
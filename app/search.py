@@ -0,0 +1,97 @@
+import logging
+import os
+from collections import namedtuple
+from typing import List, Tuple, Optional, Sequence
+
+from app.filters import _compile_filters, _score
+
+log = logging.getLogger(__name__)
+
+# collections with at least this many games are filtered in worker processes, in chunks of CHUNK_SIZE games
+PARALLEL_THRESHOLD = 20000
+CHUNK_SIZE = 25000
+
+
+class SearchResult(namedtuple('SearchResult', ['collection', 'game'])):
+    """A game found by `search_collections`, listed with the name of its collection"""
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        return f'{self.collection.name:<20.18}{self.game}'
+
+
+def _filter_chunk(fields: Tuple[str, ...],
+                  rows: List[tuple],
+                  filters: List[Tuple[str, str]]) -> Tuple[List[int], List[Tuple[int, int, int]]]:
+    """
+    Process pool entry point, filter plain (position, *fields) tuples instead of games.
+
+    Return the positions of the exact matches and the (-matches, distance, position) ranks of the close matches.
+    """
+    Row = namedtuple('Row', ('position',) + fields)
+    compiled = _compile_filters(filters)
+    exact, close = [], []
+    for row in map(Row._make, rows):
+        matches, distance = _score(row, compiled)
+        if matches == len(compiled) and not distance:
+            exact.append(row.position)
+        elif matches:
+            close.append((-matches, distance, row.position))
+    return exact, close
+
+
+def search_collections(collections: Sequence,
+                       filters: List[Tuple[str, str]],
+                       workers: Optional[int] = None) -> Tuple[List[SearchResult], List[SearchResult]]:
+    """
+    Filter every collection, return the merged exact and close matches.
+
+    Small collections are filtered in-line (using their indexes and query cache), collections with
+    at least `PARALLEL_THRESHOLD` games are split into chunks filtered by a pool of `workers` processes
+    (defaults to the cpu count, 1 filters everything in-line).
+    Exact matches are ordered by collection, close matches are ranked across all collections.
+    """
+    workers = workers or os.cpu_count() or 1
+    compiled = _compile_filters(filters)
+    fields = tuple(field for field, _ in filters)
+    exact: List[Tuple[int, int, SearchResult]] = []
+    close: List[Tuple[int, int, int, int, SearchResult]] = []
+    pending = []
+
+    large = [c for c in collections if workers > 1 and c.size >= PARALLEL_THRESHOLD]
+    if large:
+        # imported here, it pulls in multiprocessing which is slow to import and rarely needed
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        pool = None
+    try:
+        for ci, collection in enumerate(collections):
+            items = collection.items
+            if collection in large:
+                for start in range(0, len(items), CHUNK_SIZE):
+                    rows = [(position, *(getattr(item, field) for field in fields))
+                            for position, item in enumerate(items[start:start + CHUNK_SIZE], start=start)]
+                    pending.append((ci, collection, pool.submit(_filter_chunk, fields, rows, filters)))
+            else:
+                found, near = collection.query(filters)
+                sequence = collection._sequence
+                exact += [(ci, sequence[item], SearchResult(collection, item)) for item in found]
+                for item in near:
+                    matches, distance = _score(item, compiled)
+                    close.append((-matches, distance, ci, sequence[item], SearchResult(collection, item)))
+
+        for ci, collection, future in pending:
+            found, near = future.result()
+            items = collection.items
+            exact += [(ci, position, SearchResult(collection, items[position])) for position in found]
+            close += [(matches, distance, ci, position, SearchResult(collection, items[position]))
+                      for matches, distance, position in near]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    log.debug('Searched %d collections (%d in parallel with %d workers).', len(collections), len(large), workers)
+    exact.sort(key=lambda entry: entry[:2])
+    close.sort(key=lambda entry: entry[:4])
+    return [entry[-1] for entry in exact], [entry[-1] for entry in close]
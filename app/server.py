@@ -0,0 +1,297 @@
+"""
+Server mode: one in-memory `CollectionManager` shared by many clients over TCP or a unix socket.
+
+The protocol is line based. A client sends one menu command per line, exactly as it would be typed,
+the server answers with the output of the command followed by an end-of-response line: `END` + the prompt.
+Every connection has its own `Session` (active collection and menu).
+
+Commands run one at a time on the event loop, the only points where connections interleave are waiting
+for a lock, rendering a long listing and sending a response. A command holds a readers-writer lock on the manager
+and on every collection it uses, so listings of a collection run concurrently while changes to that collection
+wait for them (and the other way around). The response is rendered into memory under the locks and sent after
+they are released, so a slow client never holds up the others (or the periodic save).
+
+The periodic save runs in a thread, as it may wait for another process holding the data files (see
+`app.storage.FileLock`). A command that changes a collection appends to the journal on the event loop, so it
+stalls every connection while another process holds the files, eg. during its compaction.
+
+Import and export (`menu.path_actions`) are not served, they would let any client read and write files
+on the server's machine.
+"""
+import asyncio
+import contextlib
+import io
+import logging
+import weakref
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+from app.collections import BoardGameCollection, CollectionManager
+from app.menus import CollectionMenu, GameMenu, Menu, split_command
+from app.storage import get_manager, save_manager
+from app.utils import FAILED, Failed, Whitespace, is_number, str_sized
+
+log = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+# marks the end of a response, the rest of the line is the prompt
+END = '\x1e'
+# lines of a listing rendered before letting other connections run
+RENDER_CHUNK = 256
+# seconds between saves (a journal sync, or a compaction when the journal is large)
+SAVE_INTERVAL = 5
+
+# menu actions that change the active collection (GameMenu) or the manager (CollectionMenu),
+# every other action only reads
+GAME_WRITES = {'1', '2', '3', '5', '6'}
+COLLECTION_WRITES = {'1', '2', '3'}
+
+
+class RWLock(object):
+    """Asyncio readers-writer lock: many readers or one writer, a waiting writer goes before new readers"""
+
+    def __init__(self):
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._changed = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def read(self):
+        if self._writer or self._waiting_writers:
+            async with self._changed:
+                await self._changed.wait_for(lambda: not self._writer and not self._waiting_writers)
+        self._readers += 1
+        try:
+            yield
+        finally:
+            self._readers -= 1
+            if not self._readers:
+                await self._notify()
+
+    @contextlib.asynccontextmanager
+    async def write(self):
+        if self._writer or self._readers:
+            self._waiting_writers += 1
+            try:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+        self._writer = True
+        try:
+            yield
+        finally:
+            self._writer = False
+            await self._notify()
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+
+class Session(object):
+    """
+    Stands in for the manager in the menu commands of one connection.
+
+    The session has its own active collection and menu, everything else is the shared manager.
+    """
+
+    def __init__(self, manager: CollectionManager):
+        self._manager = manager
+        self.active = manager.active
+        self.menu: Menu = GameMenu()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._manager, name)
+
+    def __str__(self) -> str:
+        return self._manager.listing(self.active)
+
+    @property
+    def prompt(self) -> str:
+        return f'[c:{str_sized(self.active.name, 25, "...")}][m:{str_sized(self.menu.name.lower(), 25, "...")}] >> '
+
+    def refresh(self) -> None:
+        """
+        Follow a reload of the manager to the collection of the same name, fall back to the manager's active
+        (or first) collection if another session removed the session's one.
+        """
+        manager = self._manager
+        if manager._by_name.get(self.active.name) is not self.active:
+            self.active = manager._by_name.get(self.active.name) or (
+                manager.active if manager._by_name.get(manager.active.name) is manager.active else manager.items[0])
+
+    def select_active(self, item: Union[str, BoardGameCollection]) -> Optional[Failed]:
+        """Override, selecting a collection only changes the session (and is not saved)."""
+        item = self._manager.assert_item(item)
+        if not item:
+            return FAILED
+        item._load()
+        self.active = item
+
+
+class Server(object):
+    """Runs the commands of every connection on one manager, see the module docstring."""
+
+    def __init__(self, manager: CollectionManager):
+        self.manager = manager
+        self.commands = 0
+        self._manager_lock = RWLock()
+        self._collection_locks = weakref.WeakKeyDictionary()
+
+    def _lock(self, collection: BoardGameCollection) -> RWLock:
+        lock = self._collection_locks.get(collection)
+        if lock is None:
+            lock = self._collection_locks[collection] = RWLock()
+        return lock
+
+    def _manager_access(self, session: Session, action: str) -> Any:
+        """Return the manager lock context a command needs, it is always taken before any collection lock."""
+        if isinstance(session.menu, CollectionMenu) and action in COLLECTION_WRITES:
+            return self._manager_lock.write()
+        return self._manager_lock.read()
+
+    def _collection_access(self, session: Session, action: str) -> List[Any]:
+        """Return the collection lock contexts a command needs, ordered by id so two commands cannot deadlock."""
+        if isinstance(session.menu, CollectionMenu):
+            if action in ('6', '7', 'f'):
+                return [self._lock(c).read() for c in sorted(self.manager.items, key=id)]
+            return []
+        lock = self._lock(session.active)
+        return [lock.write() if action in GAME_WRITES else lock.read()]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one connection until the client sends `0` or disconnects."""
+        session = Session(self.manager)
+        peer = writer.get_extra_info('peername') or 'unix socket'
+        log.info('Client connected: %s', peer)
+        writer.write(f'{session.menu.title}\n{instructions(session.menu)}\n{END}{session.prompt}\n'.encode('utf-8'))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not await self.execute(session, line.decode('utf-8', errors='replace'), writer):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            log.info('Client disconnected: %s', peer)
+            writer.close()
+
+    async def execute(self, session: Session, line: str, writer: asyncio.StreamWriter) -> bool:
+        """Run one command line of `session` and send the response, return False when the session has ended."""
+        args = split_command(session.menu, line)
+        if not args:
+            writer.write(f'Tips: type ? for help, 0 to exit\n{END}{session.prompt}\n'.encode('utf-8'))
+            await writer.drain()
+            return True
+        action = args.pop(0)
+        self.commands += 1
+        if action not in session.menu.choices or action in session.menu.path_actions:
+            error = 'not available in server mode' if action in session.menu.path_actions else 'Invalid command'
+            writer.write(f'Error: {error}.\n{END}{session.prompt}\n'.encode('utf-8'))
+            await writer.drain()
+            return True
+
+        response = []
+        async with contextlib.AsyncExitStack() as stack:
+            await stack.enter_async_context(self._manager_access(session, action))
+            # collections are only added and removed under the manager's write lock
+            session.refresh()
+            for lock in self._collection_access(session, action):
+                await stack.enter_async_context(lock)
+            # the command runs without awaiting, so nothing else runs while stdout is redirected
+            ret, output = _run(session, session.menu.choices[action], args)
+            response.append(output)
+            if ret is session.menu.instructions:
+                response.append(f'{instructions(session.menu)}\n')
+            elif isinstance(ret, str):
+                response.append(ret[len(Whitespace.clear):] if ret.startswith(Whitespace.clear) else ret)
+                response.append('\n')
+            elif isinstance(ret, Iterator):
+                await _render(ret, response)
+            elif isinstance(ret, Menu):
+                session.menu = ret
+                response.append(f'{ret.title}\n{instructions(ret)}\n')
+        # sent without holding any lock
+        if not isinstance(ret, int):
+            response.append(f'{END}{session.prompt}\n')
+        writer.write(''.join(response).encode('utf-8'))
+        await writer.drain()
+        return not isinstance(ret, int)
+
+    async def save_periodically(self, file: Path) -> None:
+        """Save every `SAVE_INTERVAL` seconds, which also merges the changes other processes saved."""
+        while True:
+            await asyncio.sleep(SAVE_INTERVAL)
+            # no command runs while the manager is saved in the thread
+            async with self._manager_lock.write():
+                await asyncio.get_running_loop().run_in_executor(None, save_manager, file, self.manager)
+
+
+def instructions(menu: Menu) -> str:
+    """Return the instructions of `menu` without the actions that are not served"""
+    return ''.join(line for line in menu.instructions.splitlines(keepends=True)
+                   if not line.strip() or line.split()[0] not in menu.path_actions)
+
+
+def _run(session: Session, func: Any, args: List[str]) -> Tuple[Any, str]:
+    """Call a menu command with the output it prints captured, return its return value and the output."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            ret = func(session, *args)
+        except TypeError:
+            print('Invalid argument count')
+            ret = None
+        except Exception as e:
+            log.error('Command failed.', exc_info=e)
+            print(f'Error: {e!r}')
+            ret = None
+    return ret, output.getvalue()
+
+
+async def _render(lines: Iterator[str], response: List[str]) -> None:
+    """Render a listing into `response`, letting other connections run every `RENDER_CHUNK` lines."""
+    for n, line in enumerate(lines, 1):
+        if line is not Whitespace.clear:
+            response.append(line)
+        if not n % RENDER_CHUNK:
+            await asyncio.sleep(0)
+
+
+def parse_address(address: str) -> Tuple[str, Optional[str], Optional[int]]:
+    """Parse `host:port` or `unix:path` into ('tcp', host, port) or ('unix', path, None)."""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):], None
+    host, _, port = address.rpartition(':')
+    if not is_number(port):
+        raise ValueError(f'invalid address `{address}`, use host:port or unix:path')
+    return 'tcp', host or '127.0.0.1', int(port)
+
+
+async def start(server: Server, address: str) -> asyncio.AbstractServer:
+    """Start listening on `address` (see `parse_address`)."""
+    kind, host, port = parse_address(address)
+    if kind == 'unix':
+        return await asyncio.start_unix_server(server.handle, path=host)
+    return await asyncio.start_server(server.handle, host=host, port=port)
+
+
+async def serve(file: Path, address: str = DEFAULT_ADDRESS) -> None:
+    """Load the manager from `file` and serve it on `address` until cancelled, then save it."""
+    manager = get_manager(file)
+    server = Server(manager)
+    listener = await start(server, address)
+    saver = asyncio.ensure_future(server.save_periodically(file))
+    log.info('Serving on %s.', address)
+    print(f'Info: serving {file} on {address}, press ctrl+c to stop.')
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        saver.cancel()
+        save_manager(file, manager)
+        log.info('Server stopped after %d commands.', server.commands)
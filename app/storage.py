@@ -0,0 +1,664 @@
+import contextlib
+import json
+import logging
+import os
+import struct
+import zlib
+from collections import namedtuple
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import List, Dict, Iterator, Tuple, Any, Optional, Callable
+
+from app import metrics
+from app.collections import CollectionManager, BoardGameCollection
+from app.boardgame import BoardGame, GameInfo, game_info
+from app.catalog import Catalog, number_entries
+
+log = logging.getLogger(__name__)
+
+
+# -- binary snapshot format --
+# The yaml file is the (human editable) source of truth, the snapshot is a faster to load copy of it.
+#
+#   header      magic, version, collection count
+#   stamp       compaction generation, compacted journal length (see `Stamp`)
+#   catalog     entry count, byte length of the entries
+#   entry       title length, title, players, duration, recommended_age
+#   collection  name length, game count, byte length of the game records, name
+#   game        catalog position, times_played, rating (-1 if unset)
+#
+# The catalog is decoded when the first collection is used. The values of the games (players to rating) are
+# 64 bit, a snapshot whose values all fit in 32 bit is written as version 3 instead, with 32 bit values, which
+# is smaller and faster to load. Version 2 snapshots have no stamp either, version 1 snapshots
+# have no stamp and no catalog, their games are stored as title length, title, players, duration, recommended_age,
+# times_played, rating (32 bit). They are all still read.
+# All integers are little-endian, strings are utf-8.
+SNAPSHOT_MAGIC = b'BGCM'
+SNAPSHOT_VERSION = 4
+_HEADER = struct.Struct('<4sHI')
+_STAMP = struct.Struct('<QQ')
+_CATALOG = struct.Struct('<II')
+_COLLECTION = struct.Struct('<HII')
+_TITLE = struct.Struct('<H')
+_INFO = struct.Struct('<3q')
+_GAME = struct.Struct('<I2q')
+_INFO_32 = struct.Struct('<3i')
+_GAME_32 = struct.Struct('<I2i')
+_FIELDS = struct.Struct('<5i')
+
+# Changes are appended to the journal as they happen, the yaml file and the snapshot are only
+# rewritten (compacted) when the journal has grown to `COMPACT_AFTER` records.
+COMPACT_AFTER = 1000
+
+# Every compaction has a generation number. The yaml file and the snapshot are stamped with the generation that
+# wrote them and the length of the journal compacted into them, a new journal starts with a `['generation', None, n]`
+# record. A compaction interrupted before the new journal is started leaves an older journal behind, its records are
+# only replayed past the compacted length, so no record (eg. a play, which is an increment) is applied twice.
+# Files without a stamp are generation 0.
+Stamp = namedtuple('Stamp', ['generation', 'compacted'])
+NO_STAMP = Stamp(0, 0)
+
+
+def snapshot_path(p: Path) -> Path:
+    """Return the path of the binary snapshot belonging to the yaml file `p`"""
+    return p.with_suffix('.bin')
+
+
+def journal_path(p: Path) -> Path:
+    """Return the path of the journal belonging to the yaml file `p`"""
+    return p.with_suffix('.journal')
+
+
+def lock_path(p: Path) -> Path:
+    """Return the path of the lock file belonging to the yaml file `p`"""
+    return p.with_suffix('.lock')
+
+
+def get_manager(p: Path) -> CollectionManager:
+    """Load the manager from the yaml file `p` (or its snapshot), replay its journal and keep journaling"""
+    journal = Journal(journal_path(p), FileLock(lock_path(p)))
+    with metrics.span('load'), journal.lock.hold(exclusive=False):
+        manager, stamp = load_manager(p)
+        journal.base = base_state(p)
+        journal.start(stamp)
+        applied, skipped = manager.replay(journal.read())
+    if applied or skipped:
+        log.info('Replayed %d journal records, skipped %d.', applied, skipped)
+    manager.attach_journal(journal)
+    return manager
+
+
+def save_manager(p: Path, m: CollectionManager) -> None:
+    """
+    Make the manager's changes durable, compact the journal into the yaml file `p` when it has grown large.
+
+    Changes other processes saved since the manager was loaded are merged in first (see `reload_if_changed`),
+    a manager without changes of its own is not saved at all.
+    """
+    if m.journal is None:
+        with metrics.span('save'):
+            compact(p, m)
+        return
+    with metrics.span('save'), m.journal.lock.hold():
+        dirty = m.dirty
+        reload_if_changed(p, m)
+        if not dirty:
+            log.debug('No changes to save.')
+        elif m.journal.records < COMPACT_AFTER:
+            m.journal.sync()
+            log.info('Journal holds %d records, skipping compaction.', m.journal.records)
+        else:
+            compact(p, m)
+        m.mark_clean()
+
+
+def compact(p: Path, m: CollectionManager) -> None:
+    """
+    Rewrite the yaml file `p` and its snapshot from the manager, then start a new journal.
+
+    Both files are encoded before either is replaced, and stamped with the next generation (see `Stamp`).
+    A manager without a journal replaces the data, the records of the current journal are dropped.
+    """
+    journal = m.journal if m.journal is not None else Journal(journal_path(p))
+    with journal.lock.hold():
+        stamp = Stamp(journal.generation + 1, journal.size())
+        data = encode_yaml(m, stamp)
+        snapshot = encode_snapshot(m, stamp)
+        _write_atomic(p, data)
+        _write_atomic(snapshot_path(p), snapshot)
+        journal.reset(stamp.generation)
+        journal.base = base_state(p)
+    if m.journal is None:
+        journal.close()
+
+
+def reload_if_changed(p: Path, m: CollectionManager) -> bool:
+    """
+    Bring the manager up to date with the changes other processes saved to the files of `p`, return whether any were.
+
+    Records appended by others are applied to the manager as they are, unless the manager holds records of its
+    own that come before them in the journal or are not written yet: applied in another order the records can
+    end up differently (eg. a rating of a game the manager renamed), so the manager is built again from the files,
+    the whole journal and its unwritten records, as the next process to load it will. Another compaction
+    (a changed yaml file or snapshot) reloads the manager the same way.
+    """
+    journal = m.journal
+    with journal.lock.hold():
+        rewritten = _base_changed(p, journal)
+        appended = journal.appended_by_others()
+        if rewritten or appended and journal.unmerged():
+            log.info('%s was rewritten by another process, reloading.' if rewritten else
+                     'Other processes appended to the journal of %s, reloading.', p)
+            fresh, stamp = load_manager(p)
+            journal.base = base_state(p)
+            journal.start(stamp)
+            fresh.replay(_merged(journal.read()))
+            fresh.replay(_merged(journal.pending))
+            m.reload(fresh)
+            return True
+        if not appended:
+            journal.skip_written()
+            return False
+        applied, skipped = m.replay(_merged(journal.read()))
+        log.info('Merged %d journal records of other processes, skipped %d.', applied, skipped)
+        return True
+
+
+def _merged(records: Iterator[list]) -> Iterator[list]:
+    """Leave out the `select` records, merging changes keeps the manager's own active collection"""
+    return (record for record in records if record[0] != 'select')
+
+
+def load_manager(p: Path) -> Tuple[CollectionManager, Stamp]:
+    """
+    Load the manager from the snapshot if it is up to date with the yaml file `p`, otherwise from `p`.
+    Return it with the stamp of the file it was loaded from.
+    """
+    snapshot = snapshot_path(p)
+    if snapshot.exists() and (not p.exists() or snapshot.stat().st_mtime_ns >= p.stat().st_mtime_ns):
+        try:
+            manager, stamp = read_snapshot(snapshot)
+        except (OSError, ValueError, struct.error) as e:
+            log.warning('Could not read snapshot, falling back to yaml.', exc_info=e)
+        else:
+            log.info('Loaded %d collections from snapshot.', len(manager.items))
+            return manager, stamp
+    return read_yaml(p)
+
+
+def export_yaml(p: Path) -> None:
+    """
+    Rewrite the yaml file `p` from its snapshot (or itself, if it is newer) and journal.
+
+    This is a compaction: the snapshot is rewritten as well and a new journal started, the records of the old
+    one are part of the yaml file now and replaying them again would count their plays twice.
+    """
+    if not any(path.exists() for path in (p, snapshot_path(p), journal_path(p))):
+        print(f'Error: nothing to export, there is no {p}, snapshot or journal.')
+        return
+    journal = Journal(journal_path(p))
+    with journal.lock.hold():
+        manager, stamp = load_manager(p)
+        journal.start(stamp)
+        manager.replay(journal.read())
+        manager.attach_journal(journal)
+        compact(p, manager)
+    journal.close()
+
+
+def import_yaml(p: Path) -> None:
+    """Rebuild the snapshot from the yaml file `p`"""
+    if not p.exists():
+        print(f'Error: nothing to import, there is no {p}.')
+        return
+    with FileLock(lock_path(p)).hold():
+        _write_atomic(snapshot_path(p), encode_snapshot(*read_yaml(p)))
+
+
+# -- locking and change detection --
+# Processes sharing the data files hold an advisory lock (`fcntl.flock` on the lock file) while they use them:
+# shared while loading, exclusive while saving and while appending to the journal.
+# Where fcntl is missing (eg. Windows) nothing is locked.
+
+FileState = namedtuple('FileState', ['mtime_ns', 'size', 'digest'])
+
+
+@lru_cache(maxsize=None)
+def _fcntl() -> Any:
+    try:
+        import fcntl
+    except ImportError:
+        log.warning('fcntl is not available, the data files are not locked.')
+        return None
+    return fcntl
+
+
+class FileLock(object):
+    """
+    Advisory lock on the file `p`, reentrant within the process.
+
+    A nested `hold` keeps the mode of the outer one, so never ask for the exclusive lock inside a shared one.
+    """
+
+    def __init__(self, p: Path):
+        self.path = p
+        self._file = None
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def hold(self, exclusive: bool = True) -> Iterator[None]:
+        fcntl = _fcntl()
+        if fcntl is not None and not self._depth:
+            if self._file is None:
+                self.path.parent.mkdir(exist_ok=True)
+                self._file = self.path.open(mode='ab')
+            with metrics.span('lock wait'):
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if fcntl is not None and not self._depth:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def file_state(p: Path, digest: bool = False) -> Optional[FileState]:
+    """Return the modification time, size and (if `digest`) content hash of the file `p`, None if it is missing"""
+    try:
+        stat = p.stat()
+    except FileNotFoundError:
+        return None
+    return FileState(stat.st_mtime_ns, stat.st_size, _digest(p) if digest else None)
+
+
+def base_state(p: Path) -> Dict[Path, Optional[FileState]]:
+    """
+    Return the state of the yaml file `p` and its snapshot.
+
+    Only the content of the file a manager is loaded from (the snapshot if there is one) is hashed.
+    """
+    snapshot = snapshot_path(p)
+    loaded = snapshot if snapshot.exists() else p
+    return {path: file_state(path, digest=path == loaded) for path in (p, snapshot)}
+
+
+def _base_changed(p: Path, journal: 'Journal') -> bool:
+    """
+    Return whether the yaml file `p` or its snapshot changed since `journal.base` was taken, or the journal was emptied.
+
+    A file with a new modification time or size only counts as changed if its content hash did (when known).
+    """
+    if journal.truncated():
+        return True
+    for path, old in journal.base.items():
+        new = file_state(path)
+        if new is None or old is None:
+            if new != old:
+                return True
+        elif new[:2] != old[:2]:
+            if old.digest is None or _digest(path) != old.digest:
+                return True
+            journal.base[path] = new._replace(digest=old.digest)
+    return False
+
+
+def _digest(p: Path) -> int:
+    """Return the CRC32 of the file `p`, enough to tell a rewritten file from a touched one and cheap to compute"""
+    crc = 0
+    with p.open(mode='rb') as f:
+        for chunk in iter(partial(f.read, 1 << 16), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+# -- yaml --
+
+@lru_cache(maxsize=None)
+def yaml_backend() -> Tuple[Any, Any, str]:
+    """
+    Return the yaml (loader, dumper, backend name) to use. yaml is imported on the first call,
+    most runs only read the snapshot and append to the journal and never need it.
+
+    Prefer the libyaml (C) implementation, the pure python one is several times slower on large files.
+    """
+    import yaml
+    if yaml.__with_libyaml__:
+        return yaml.CSafeLoader, yaml.CSafeDumper, 'libyaml'
+    return yaml.SafeLoader, yaml.SafeDumper, 'python'
+
+
+def read_yaml(p: Path) -> Tuple[CollectionManager, Stamp]:
+    """Read the manager and the stamp of the yaml file `p`, an empty manager if it is missing or invalid"""
+    if p.exists():
+        import yaml
+        loader, _, backend = yaml_backend()
+        log.info('Reading %s using the %s yaml backend.', p, backend)
+        with p.open(encoding='utf-8') as f:
+            data = yaml.load(f, Loader=loader)
+        if isinstance(data, dict) and 'name' in data and 'items' in data and data['name'] == 'manager':
+            try:
+                manager = _read_manager(data)
+            except Exception as e:
+                log.error('Error when reading file', exc_info=e)
+            else:
+                log.info('Loaded %d collections from file.', len(manager.items))
+                return manager, _read_stamp(data)
+    manager = CollectionManager(active=None, items=[])
+    log.warning('Could not read data from file')
+    return manager, NO_STAMP
+
+
+def _read_stamp(data: dict) -> Stamp:
+    compaction = data.get('compaction')
+    try:
+        return Stamp(int(compaction['generation']), int(compaction['journal']))
+    except (TypeError, KeyError, ValueError):
+        return NO_STAMP
+
+
+def _read_manager(data: dict) -> CollectionManager:
+    """Build the manager from the output of `CollectionManager.save()`, or the older layout without a catalog"""
+    catalog = Catalog()
+    entries = [game_info(*args) for args in data['catalog']] if 'catalog' in data else None
+    return CollectionManager(active=None, items=                                            # noqa E251
+        [BoardGameCollection(name=collection['name'], catalog=catalog, items=               # noqa E251
+            [_new_game(entries, args) for args in collection['items']]                      # noqa E128
+        ) for collection in data['items']],
+        catalog=catalog
+    )
+
+
+def _new_game(entries: Optional[List[GameInfo]], args: list) -> BoardGame:
+    """Create a game saved as [catalog position, times_played, rating], or in full if there is no catalog"""
+    if entries is None:
+        return BoardGame(*args)
+    return BoardGame.from_info(entries[args[0]], *args[1:])
+
+
+def encode_yaml(m: CollectionManager, stamp: Stamp) -> bytes:
+    """Return the yaml file of the manager, stamped with `stamp`"""
+    import yaml
+    _, dumper, backend = yaml_backend()
+    log.info('Encoding yaml using the %s yaml backend.', backend)
+    data = {'compaction': {'generation': stamp.generation, 'journal': stamp.compacted}, **m.save()}
+    return yaml.dump(data, Dumper=dumper, default_flow_style=False, explicit_start=True, encoding='utf-8')
+
+
+# -- snapshot --
+
+def read_snapshot(p: Path) -> Tuple[CollectionManager, Stamp]:
+    """
+    Read the collections and the stamp of a snapshot, the games of a collection are decoded the first time it
+    is used
+    """
+    buffer = p.read_bytes()
+    magic, version, count = _HEADER.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC or version not in (1, 2, 3, SNAPSHOT_VERSION):
+        raise ValueError(f'{p} is not a version {SNAPSHOT_VERSION} snapshot')
+    offset = _HEADER.size
+    stamp = NO_STAMP
+    if version >= 3:
+        stamp = Stamp(*_STAMP.unpack_from(buffer, offset))
+        offset += _STAMP.size
+    if version == 1:
+        decode = _decode_games_v1
+    else:
+        entries, length = _CATALOG.unpack_from(buffer, offset)
+        offset += _CATALOG.size
+        info, game = (_INFO, _GAME) if version >= 4 else (_INFO_32, _GAME_32)
+        catalog = lru_cache(maxsize=None)(partial(_decode_catalog, info, buffer, offset, entries))
+        decode = partial(_decode_games, catalog, game)
+        offset += length
+    catalog = Catalog()
+    collections = []
+    for _ in range(count):
+        name_length, games, length = _COLLECTION.unpack_from(buffer, offset)
+        offset += _COLLECTION.size
+        name = buffer[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        loader = partial(decode, buffer, offset, games)
+        collections.append(BoardGameCollection(name, loader=loader, count=games, catalog=catalog))
+        offset += length
+    if offset != len(buffer):
+        raise ValueError(f'{p} has {len(buffer) - offset} bytes of trailing data')
+    return CollectionManager(active=None, items=collections, catalog=catalog), stamp
+
+
+def encode_snapshot(m: CollectionManager, stamp: Stamp) -> bytes:
+    """Return the snapshot of the manager, stamped with `stamp`"""
+    log.info('Encoding snapshot.')
+    entries, positions = number_entries(m.items)
+    try:
+        return _encode_snapshot(m, stamp, entries, positions, 3, _INFO_32, _GAME_32)
+    except struct.error:
+        return _encode_snapshot(m, stamp, entries, positions, SNAPSHOT_VERSION, _INFO, _GAME)
+
+
+def _encode_snapshot(m: CollectionManager,
+                     stamp: Stamp,
+                     entries: List[GameInfo],
+                     positions: Dict[int, int],
+                     version: int,
+                     info: struct.Struct,
+                     game: struct.Struct) -> bytes:
+    catalog = b''.join(_encode_info(info, entry) for entry in entries)
+    chunks = [_HEADER.pack(SNAPSHOT_MAGIC, version, len(m.items)), _STAMP.pack(*stamp),
+              _CATALOG.pack(len(entries), len(catalog)), catalog]
+    for collection in m.items:
+        name = collection.name.encode('utf-8')
+        records = b''.join(game.pack(positions[id(item.info)], item.times_played,
+                                     -1 if item.rating is None else item.rating) for item in collection.items)
+        chunks += [_COLLECTION.pack(len(name), len(collection.items), len(records)), name, records]
+    return b''.join(chunks)
+
+
+def _encode_info(info: struct.Struct, entry: GameInfo) -> bytes:
+    title = entry.title.encode('utf-8')
+    return _TITLE.pack(len(title)) + title + info.pack(entry.players, entry.duration, entry.recommended_age)
+
+
+def _decode_catalog(info: struct.Struct, buffer: bytes, offset: int, count: int) -> List[GameInfo]:
+    entries = []
+    for _ in range(count):
+        (title_length,) = _TITLE.unpack_from(buffer, offset)
+        offset += _TITLE.size
+        title = buffer[offset:offset + title_length].decode('utf-8')
+        offset += title_length
+        entries.append(GameInfo(title, *info.unpack_from(buffer, offset)))
+        offset += info.size
+    return entries
+
+
+def _decode_games(catalog: Callable[[], List[GameInfo]],
+                  game: struct.Struct,
+                  buffer: bytes,
+                  offset: int,
+                  count: int) -> List[BoardGame]:
+    entries = catalog()
+    return [BoardGame.from_info(entries[position], times_played, None if rating < 0 else rating)
+            for position, times_played, rating in game.iter_unpack(buffer[offset:offset + count * game.size])]
+
+
+def _decode_games_v1(buffer: bytes, offset: int, count: int) -> List[BoardGame]:
+    games = []
+    for _ in range(count):
+        (title_length,) = _TITLE.unpack_from(buffer, offset)
+        offset += _TITLE.size
+        title = buffer[offset:offset + title_length].decode('utf-8')
+        offset += title_length
+        players, duration, recommended_age, times_played, rating = _FIELDS.unpack_from(buffer, offset)
+        offset += _FIELDS.size
+        games.append(BoardGame(title, players, duration, recommended_age, times_played,
+                               None if rating < 0 else rating))
+    return games
+
+
+def _write_atomic(p: Path, data: bytes) -> None:
+    """Replace the file `p` with `data`, readers see either the old or the new file, never a partial one"""
+    p.parent.mkdir(exist_ok=True)
+    tmp = p.with_name(p.name + '.tmp')
+    with tmp.open(mode='wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+    metrics.count('bytes written', len(data))
+
+
+# -- journal --
+
+class Journal(object):
+    """
+    Append-only log of the changes made to a manager since the last compaction, one json list per line.
+
+    Records are flushed as they are appended (unless `autoflush` is turned off), so they survive
+    a crash of the program. A record that was cut off by a crash is dropped the next time the journal is read.
+
+    Several processes may append to the same journal, records are written under the exclusive `lock`.
+    `offset` is the part of the journal read by this process, `base` the state of the files the manager was
+    loaded from, see `reload_if_changed`. `generation` is the last compaction known to the process, see `Stamp`.
+    """
+
+    def __init__(self, p: Path, lock: Optional[FileLock] = None):
+        self.path = p
+        self.lock = lock if lock is not None else FileLock(lock_path(p))
+        self.records = 0
+        self.autoflush = True
+        self.offset = 0
+        self.generation = 0
+        self.base: Dict[Path, Optional[FileState]] = {}
+        # appended records that are not written yet
+        self.pending: List[list] = []
+        # bytes written by this process after `offset`
+        self._written = 0
+        self._file = None
+
+    def start(self, stamp: Stamp) -> None:
+        """Start reading at the first record that is not part of files stamped `stamp`"""
+        generation, header = self._header()
+        if generation < stamp.generation:
+            log.warning('A compaction to generation %d was interrupted, skipping the %d bytes of the journal '
+                        'it holds.', stamp.generation, stamp.compacted)
+            self.offset = max(stamp.compacted, header)
+        else:
+            if generation > stamp.generation:
+                log.warning('The journal (generation %d) is newer than the data files (generation %d).',
+                            generation, stamp.generation)
+            self.offset = header
+        self.generation = max(generation, stamp.generation)
+        self.records = self._written = 0
+
+    def _header(self) -> Tuple[int, int]:
+        """Return the generation of the journal and the length of its `generation` record (0 if it has none)"""
+        try:
+            with self.path.open(mode='rb') as f:
+                line = f.readline()
+            action, _, generation = json.loads(line)
+        except (OSError, ValueError, TypeError):
+            return 0, 0
+        if action != 'generation' or not isinstance(generation, int) or not line.endswith(b'\n'):
+            return 0, 0
+        return generation, len(line)
+
+    def read(self) -> Iterator[list]:
+        """Yield the records after `offset`, the ones not read yet"""
+        if not self.path.exists():
+            return
+        offset = self.offset
+        with self.path.open(mode='rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('record is incomplete')
+                    record = json.loads(line)
+                    if not isinstance(record, list) or len(record) < 2:
+                        raise ValueError('record is not a list of at least 2 values')
+                except ValueError as e:
+                    log.warning('Dropping the journal from an invalid record at byte %d: %s', offset, e)
+                    break
+                offset += len(line)
+                self.records += 1
+                yield record
+        if offset != self.path.stat().st_size:
+            os.truncate(self.path, offset)
+        self.offset = offset
+        self._written = 0
+
+    def appended_by_others(self) -> bool:
+        """Return whether other processes wrote records after `offset`"""
+        return self.size() != self.offset + self._written
+
+    def unmerged(self) -> bool:
+        """Return whether this process wrote records after `offset` or holds records that are not written yet"""
+        return bool(self._written or self.pending)
+
+    def truncated(self) -> bool:
+        """Return whether the journal is shorter than `offset`, eg. emptied by another process"""
+        return self.size() < self.offset
+
+    def skip_written(self) -> None:
+        """Move `offset` past the records this process wrote"""
+        self.offset += self._written
+        self._written = 0
+
+    def size(self) -> int:
+        """Return the length of the journal file, records of other processes included"""
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, record: list) -> None:
+        self.pending.append(record)
+        self.records += 1
+        if self.autoflush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the pending records"""
+        if not self.pending:
+            return
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in self.pending).encode('utf-8')
+        with self.lock.hold():
+            if self._file is None:
+                self.path.parent.mkdir(exist_ok=True)
+                self._file = self.path.open(mode='ab')
+            self._file.write(data)
+            self._file.flush()
+        self.pending.clear()
+        self._written += len(data)
+        metrics.count('bytes written', len(data))
+
+    def sync(self) -> None:
+        """Make sure the appended records have reached the disk"""
+        self.flush()
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def reset(self, generation: int) -> None:
+        """Start the journal of `generation`, in place so other processes keep appending to the same file"""
+        self.pending.clear()
+        header = json.dumps(['generation', None, generation], separators=(',', ':')).encode('utf-8') + b'\n'
+        with self.lock.hold():
+            if self._file is None:
+                self.path.parent.mkdir(exist_ok=True)
+                self._file = self.path.open(mode='ab')
+            os.truncate(self.path, 0)
+            self._file.write(header)
+            self._file.flush()
+        self.generation = generation
+        self.offset = len(header)
+        self.records = self._written = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.lock.close()
@@ -1,11 +1,33 @@
+from functools import lru_cache
+
+
+class Failed(object):
+    """The return value of a menu command that failed, the command has printed its error already"""
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return 'FAILED'
+
+
+FAILED = Failed()
+
+
+def is_number(x: str) -> bool:
+    """Return whether `x` is a non-negative integer `int()` accepts (str.isdigit alone also accepts eg. '²')"""
+    return x.isdigit() and x.isascii()
+
+
 class Whitespace(object):
     line = '\n' + '---' * 30 + '\n'
     weak_line = '\n' + '-  ' * 30 + '\n'
     clear = 50 * '\n'
 
     @staticmethod
+    @lru_cache(maxsize=128)
     def big_title(titletext: str) -> str:
-        """Generate a fancy title spacer, the titletext must be less than 40 characters."""
+        """Generate a fancy title spacer, the titletext must be less than 40 characters. Titles are cached."""
         if len(titletext) > 40:
             print(f'Warning: titletext larger than 40 charachters!\n{titletext}')
             titletext = 'Invalid title, stupid.'
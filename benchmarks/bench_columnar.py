@@ -0,0 +1,96 @@
+"""
+Compare the columnar (numpy) filter backend with the pure python `_filter`.
+
+Random queries are run through both backends for several seeds and shares of unrated games, with and without
+a trigram index of the titles, and the results must be identical (exit status 1 otherwise). Then both backends
+are timed on one large collection. usage: python -m benchmarks.bench_columnar [games] [queries]
+"""
+import random
+import sys
+import time
+from typing import List
+
+from app import columnar
+from app.boardgame import BoardGame, BOARDGAME_NUMERIC_FIELDS
+from app.filters import _filter
+from app.indexes import TrigramIndex
+from benchmarks.synthetic import make_data
+
+# (seed, share of games without a rating) of the differential check
+CASES = [(seed, unrated) for seed in range(3) for unrated in (0.0, 0.5, 1.0)]
+# games per collection of the differential check, small enough to run many queries
+CHECK_GAMES = 2000
+
+
+def random_filters(rng: random.Random, games: int) -> list:
+    filters = []
+    for field in rng.sample(('title',) + BOARDGAME_NUMERIC_FIELDS, rng.randint(1, 4)):
+        low, high = rng.randint(0, 100), rng.randint(0, 200)
+        if field == 'title':
+            value = f'game-0-{rng.randrange(games * 2)}'
+        elif rng.random() < 0.5:
+            # ranges: closed (possibly reversed), open ended and invalid
+            value = rng.choice((f'{low}..{high}', f'{high}..{low}', f'{low}..', f'..{high}', f'{low}..x'))
+        else:
+            value = rng.choice((str(rng.randint(0, 200)), str(rng.randint(0, 10)), 'x', '1..'))
+        filters.append((field, value))
+    return filters
+
+
+def make_items(games: int, seed: int, unrated: float) -> List[BoardGame]:
+    fields = {'rating': lambda rng: '' if rng.random() < unrated else str(rng.randint(0, 10))}
+    return [BoardGame(*args) for args in make_data(1, games, seed, fields)['items'][0]['items']]
+
+
+def check(games: int, queries: int) -> List[str]:
+    """Run `queries` random queries of every case in `CASES` through both backends, return the differences"""
+    failures = []
+    for seed, unrated in CASES:
+        rng = random.Random(seed)
+        items = make_items(games, seed, unrated)
+        table = columnar.ColumnarTable(items)
+        titles = TrigramIndex()
+        for item in items:
+            titles.add(item)
+        for i in range(queries):
+            filters = random_filters(rng, games)
+            expected = _filter(items, filters)
+            if table.filter(filters, titles if i % 2 else None) != expected:
+                failures.append(f'seed {seed}, {unrated:.0%} unrated, trigram index {bool(i % 2)}: '
+                                f'backends differ for {filters}')
+    return failures
+
+
+def main(games: int, queries: int) -> int:
+    if not columnar.available():
+        print('numpy is not installed, the columnar backend is not available.')
+        return 0
+    failures = check(min(games, CHECK_GAMES), queries)
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        return 1
+    print(f'{len(CASES)} cases x {queries} queries on {min(games, CHECK_GAMES)} games, identical results.')
+
+    rng = random.Random(0)
+    items = make_items(games, 0, 0.5)
+    start = time.perf_counter()
+    table = columnar.ColumnarTable(items)
+    print(f'built columns for {games} games in {time.perf_counter() - start:.3f}s')
+    python_time = columnar_time = 0.0
+    for _ in range(queries):
+        filters = random_filters(rng, games)
+        start = time.perf_counter()
+        _filter(items, filters)
+        python_time += time.perf_counter() - start
+        start = time.perf_counter()
+        table.filter(filters)
+        columnar_time += time.perf_counter() - start
+    print(f'{queries} queries, python {python_time / queries * 1000:.1f}ms/query, '
+          f'columnar {columnar_time / queries * 1000:.1f}ms/query')
+    return 0
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    raise SystemExit(main(*(args or [100000, 50])))
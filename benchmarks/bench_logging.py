@@ -0,0 +1,61 @@
+"""
+Measure the cost of logging calls on the hot paths.
+
+Compares f-string and %-style TRACE calls while TRACE is disabled (the default level is INFO),
+then the time an enabled INFO call spends in the calling thread when writing the log file
+directly and through the queue of `app.setup_logging`. usage: python -m benchmarks.bench_logging [calls]
+"""
+import atexit
+import logging
+import sys
+import tempfile
+import time
+from logging import handlers
+from pathlib import Path
+
+from app import setup_logging, format_string
+
+log = logging.getLogger('benchmarks.bench_logging')
+
+
+def per_call(func, calls: int) -> float:
+    """Return the time of one call of `func` in nanoseconds."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main(calls: int) -> None:
+    filters = [('title', 'gloomhaven'), ('players', '4'), ('duration', '30..90')] * 5
+    args = ['4', 'players', '4', 'duration', '30..90', 'page', '2']
+
+    with tempfile.TemporaryDirectory() as directory:
+        listener = setup_logging(logging.INFO, Path(directory, 'queued.log'))
+        root_log = logging.getLogger()
+        queue_handler = root_log.handlers[-1]
+
+        print(f'disabled trace, {calls} calls')
+        baseline = per_call(lambda: None, calls)
+        print(f'  {"no call":<24}{baseline:>8.0f} ns')
+        print(f'  {"f-string":<24}{per_call(lambda: log.trace(f"filters: {filters} args: {args}"), calls):>8.0f} ns')
+        print(f'  {"%-style":<24}{per_call(lambda: log.trace("filters: %s args: %s", filters, args), calls):>8.0f} ns')
+
+        calls //= 10
+        print(f'enabled info, {calls} calls (time spent in the calling thread)')
+        print(f'  {"queue handler":<24}{per_call(lambda: log.info("filters: %s", filters), calls):>8.0f} ns')
+
+        root_log.removeHandler(queue_handler)
+        file_handler = handlers.RotatingFileHandler(Path(directory, 'direct.log'), maxBytes=5242880, backupCount=5,
+                                                    encoding='utf8')
+        file_handler.setFormatter(logging.Formatter(format_string))
+        root_log.addHandler(file_handler)
+        print(f'  {"rotating file handler":<24}{per_call(lambda: log.info("filters: %s", filters), calls):>8.0f} ns')
+        root_log.removeHandler(file_handler)
+        file_handler.close()
+        atexit.unregister(listener.stop)
+        listener.stop()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,33 @@
+"""
+Time a search across all collections with different worker counts.
+
+usage: python -m benchmarks.bench_search [collections] [games per collection]
+"""
+import os
+import sys
+import time
+
+from app.boardgame import BoardGame
+from app.collections import BoardGameCollection
+from app.search import search_collections
+from benchmarks.synthetic import make_data
+
+FILTERS = [('players', '4'), ('duration', '0..60')]
+
+
+def main(collections: int, games: int) -> None:
+    data = make_data(collections, games)
+    shelves = [BoardGameCollection(c['name'], [BoardGame(*args) for args in c['items']], cache_size=0)
+               for c in data['items']]
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        exact, close = search_collections(shelves, FILTERS, workers)
+        print(f'{collections} x {games} games  workers {workers:>3}  {time.perf_counter() - start:8.3f}s  '
+              f'({len(exact)} exact, {len(close)} close)')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args or [8, 100000]))
@@ -0,0 +1,75 @@
+"""
+Measure the command throughput of the server mode with many concurrent clients.
+
+Starts a server on a temporary unix socket (in this process) with a synthetic collection per client,
+then every client sends a mix of reads and writes and waits for each response.
+usage: python -m benchmarks.bench_server [clients] [commands per client] [games per collection]
+"""
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from app.server import END, Server, start
+from benchmarks.synthetic import make_data, make_manager
+
+
+async def client(address: str, number: int, commands: int, games: int, latencies: List[float]) -> None:
+    rng = random.Random(number)
+    reader, writer = await asyncio.open_unix_connection(address[len('unix:'):])
+
+    async def send(line: str) -> None:
+        start = time.perf_counter()
+        writer.write(f'{line}\n'.encode('utf-8'))
+        while not (await reader.readline()).startswith(END.encode('utf-8')):
+            pass
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    while not (await reader.readline()).startswith(END.encode('utf-8')):
+        pass
+    # half of the clients share the first collection, the others have one each
+    collection = 0 if number % 2 else number
+    await send('8')
+    await send(f'5 collection-{collection}')
+    await send('8')
+    for i in range(commands):
+        roll = rng.random()
+        if roll < 0.4:
+            await send(f'4 players {rng.randint(1, 8)} limit 10')
+        elif roll < 0.6:
+            await send(f'4 page {rng.randint(1, max(games // 50, 1))}')
+        elif roll < 0.8:
+            await send(f'6 game-{collection}-{rng.randrange(games)}')
+        elif roll < 0.9:
+            await send(f'1 new-{number}-{i} 4 60 10')
+        else:
+            await send(f'5 game-{collection}-{rng.randrange(games)} {rng.randint(1, 10)}')
+    writer.write(b'0\n')
+    writer.close()
+
+
+async def main(clients: int, commands: int, games: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        address = f'unix:{Path(directory, "server.sock")}'
+        server = Server(make_manager(make_data(clients, games)))
+        listener = await start(server, address)
+        latencies: List[float] = []
+        start_time = time.perf_counter()
+        await asyncio.gather(*(client(address, n, commands, games, latencies) for n in range(clients)))
+        elapsed = time.perf_counter() - start_time
+        listener.close()
+        await listener.wait_closed()
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f'{clients} clients x {commands} commands on {games} games per collection: {len(latencies)} commands in '
+          f'{elapsed:.2f}s, {len(latencies) / elapsed:.0f} commands/s')
+    print(f'latency ms: p50 {percentiles[49]:.2f}  p95 {percentiles[94]:.2f}  p99 {percentiles[98]:.2f}  '
+          f'max {max(latencies):.2f}')
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [20, 500, 2000][len(args):])))
@@ -0,0 +1,164 @@
+"""
+Time the main operations of the program on synthetic data, compare the results against a stored baseline.
+
+Each operation is timed separately (see `BENCHMARKS`) and reported with its throughput, latency percentiles
+and peak memory of one extra run under `tracemalloc`. Results can be written as JSON and compared to
+the JSON of an earlier run, the exit status is 1 if an operation got slower (or used more memory)
+than the baseline by more than the tolerance.
+
+usage: python -m benchmarks.bench_suite [--collections N] [--games N] [--repeat N]
+                                        [--output results.json] [--baseline baseline.json] [--tolerance 0.25]
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from app.boardgame import BOARDGAME_FIELD_CHECK
+from app.filters import _filter, stringify_filter_results, validate_filters
+from app.storage import compact, get_manager, save_manager
+from benchmarks.synthetic import make_data, make_manager
+
+# differences below these are noise and never a regression
+NOISE = {'p50_ms': 0.05, 'peak_kib': 16}
+
+
+def random_filter_args(rng: random.Random, games: int) -> List[str]:
+    """Return filter arguments as typed by a user, eg: ['players', '4', 'duration', '30..90']"""
+    choices = {
+        'title': lambda: f'game-0-{rng.randrange(games)}',
+        'players': lambda: str(rng.randint(1, 8)),
+        'duration': lambda: f'{rng.choice((15, 30, 45))}..{rng.choice((60, 90, 120))}',
+        'recommended_age': lambda: str(rng.randint(3, 18)),
+        'times_played': lambda: str(rng.randint(0, 50)),
+        'rating': lambda: str(rng.randint(0, 10)),
+    }
+    args = []
+    for field in rng.sample(sorted(choices), rng.randint(1, 3)):
+        args += [field, choices[field]()]
+    return args
+
+
+def measure(operation: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Run `operation` `repeat` times, return its throughput, latency percentiles (ms) and peak memory (KiB)."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        latencies.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'runs': repeat,
+        'ops_per_s': repeat / (sum(latencies) / 1000) if sum(latencies) else float('inf'),
+        'p50_ms': percentiles[49],
+        'p95_ms': percentiles[94],
+        'p99_ms': percentiles[98],
+        'max_ms': max(latencies),
+        'peak_kib': peak / 1024,
+    }
+
+
+def run(collections: int, games: int, repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """Run every benchmark on a fresh synthetic dataset in a temporary directory."""
+    rng = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        file = Path(directory, 'boardgamecollections.yml')
+        compact(file, make_manager(make_data(collections, games, seed)))
+        with contextlib.redirect_stdout(devnull):
+            results['get_manager'] = measure(lambda: get_manager(file), repeat)
+
+            manager = get_manager(file)
+            collection = manager.active
+            collection._load()
+            names = [game.name for game in collection.items]
+            results['get_item (name)'] = measure(lambda: collection.get_item(rng.choice(names)), repeat * 100)
+            results['get_item (index)'] = measure(lambda: collection.get_item(str(rng.randrange(games))),
+                                                  repeat * 100)
+
+            new_titles = (f'new-game-{i}' for i in itertools.count())
+            results['add_game'] = measure(lambda: collection.add_game(next(new_titles), '4', '60', '10'), repeat * 10)
+            results['save_manager (journal)'] = measure(lambda: save_manager(file, manager), repeat)
+            results['save_manager (compact)'] = measure(lambda: compact(file, manager), repeat)
+
+            items = collection.items
+            results['validate_filters + _filter'] = measure(
+                lambda: _filter(items, validate_filters(BOARDGAME_FIELD_CHECK.keys(),
+                                                        *random_filter_args(rng, games))), repeat)
+            results['list_games (filters)'] = measure(
+                lambda: ''.join(collection.list_games(*random_filter_args(rng, games))), repeat)
+            results['list_games (page)'] = measure(
+                lambda: ''.join(collection.list_games('page', str(rng.randint(1, max(games // 50, 1))))), repeat * 10)
+
+            exact, close = _filter(items, [('players', '4'), ('duration', '30..90')])
+            results['stringify_filter_results'] = measure(
+                lambda: stringify_filter_results(collection.header, exact, close), repeat)
+            manager.journal.close()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Return the regressions of `results` against `baseline`: p50 latency or peak memory up by over `tolerance`."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric, noise in NOISE.items():
+            if result[metric] > before[metric] * (1 + tolerance) + noise:
+                regressions.append(f'{name}: {metric} {before[metric]:.3f} -> {result[metric]:.3f}')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_suite', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--collections', type=int, default=4)
+    parser.add_argument('--games', type=int, default=5000, help='games per collection')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per benchmark (cheap operations run more)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', metavar='FILE', help='write the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against the JSON of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 is 25%%')
+    args = parser.parse_args()
+
+    results = run(args.collections, args.games, args.repeat, args.seed)
+    print(f'{args.collections} collections x {args.games} games, python {platform.python_version()}')
+    print('benchmark'.ljust(30) + 'ops/s'.rjust(11) + 'p50 ms'.rjust(10) + 'p95 ms'.rjust(10) + 'p99 ms'.rjust(10)
+          + 'max ms'.rjust(10) + 'peak KiB'.rjust(11))
+    for name, result in results.items():
+        print(f'{name:<30}{result["ops_per_s"]:>11.1f}{result["p50_ms"]:>10.3f}{result["p95_ms"]:>10.3f}'
+              f'{result["p99_ms"]:>10.3f}{result["max_ms"]:>10.3f}{result["peak_kib"]:>11.1f}')
+
+    if args.output:
+        meta = {'collections': args.collections, 'games': args.games, 'repeat': args.repeat, 'seed': args.seed,
+                'python': platform.python_version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        Path(args.output).write_text(json.dumps({'meta': meta, 'results': results}, indent=2), encoding='utf-8')
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        if (baseline['meta']['collections'], baseline['meta']['games']) != (args.collections, args.games):
+            print('Warning: the baseline was made with a different dataset size.', file=sys.stderr)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+        print(f'no regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
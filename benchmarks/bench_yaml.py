@@ -0,0 +1,40 @@
+"""
+Compare load and save times of the pure python and the libyaml yaml backends.
+
+usage: python -m benchmarks.bench_yaml [sizes...]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from benchmarks.synthetic import make_data
+
+BACKENDS = {'python': (yaml.SafeLoader, yaml.SafeDumper)}
+if yaml.__with_libyaml__:
+    BACKENDS['libyaml'] = (yaml.CSafeLoader, yaml.CSafeDumper)
+
+
+def bench(games: int, directory: Path) -> None:
+    data = make_data(collections=1, games=games)
+    for backend, (loader, dumper) in BACKENDS.items():
+        p = Path(directory, f'{backend}-{games}.yml')
+        start = time.perf_counter()
+        with p.open(mode='w', encoding='UTF-8') as f:
+            yaml.dump(data, f, Dumper=dumper, default_flow_style=False, explicit_start=True)
+        save_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with p.open(encoding='utf-8') as f:
+            yaml.load(f, Loader=loader)
+        load_time = time.perf_counter() - start
+        print(f'{games:>8} games  {backend:>8}  load {load_time:8.3f}s  save {save_time:8.3f}s')
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    with tempfile.TemporaryDirectory() as directory:
+        for games in sizes:
+            bench(games, Path(directory))
@@ -0,0 +1,69 @@
+"""
+Check the running aggregates against a recomputation after random changes, exits with status 1 on a mismatch.
+
+Some changes use invalid values (eg. '²', which str.isdigit accepts and int() does not), they must be rejected
+and leave every game tracked. Also compares the time of reading the aggregates with a full scan of the games.
+usage: python -m benchmarks.check_aggregates [games] [changes] [seed]
+"""
+import contextlib
+import os
+import random
+import sys
+import time
+
+from app.aggregates import CollectionAggregates
+from app.boardgame import BOARDGAME_NUMERIC_FIELDS
+from benchmarks.synthetic import make_data, make_manager
+
+# values a numeric field must reject
+INVALID_VALUES = ('\u00b2', '\u0663', '-1', 'x', '')
+
+
+def main(games: int, changes: int, seed: int) -> int:
+    rng = random.Random(seed)
+    manager = make_manager(make_data(3, games, seed))
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(changes):
+            collection = rng.choice(manager.items)
+            titles = [game.title for game in collection.items]
+            roll = rng.random()
+            if roll < 0.3 or not titles:
+                collection.add_game(f'new-{i}', str(rng.randint(1, 8)), str(rng.randint(10, 200)),
+                                    rng.choice(INVALID_VALUES) if rng.random() < 0.1 else str(rng.randint(3, 18)))
+            elif roll < 0.5:
+                collection.remove_item(rng.choice(titles))
+            elif roll < 0.7:
+                collection.play_game(rng.choice(titles))
+            elif roll < 0.9:
+                field = rng.choice(BOARDGAME_NUMERIC_FIELDS)
+                value = rng.choice(INVALID_VALUES) if rng.random() < 0.1 else str(rng.randint(0, 50))
+                collection.edit_item(rng.choice(titles), field, value)
+            else:
+                collection.edit_item(rng.choice(titles), 'title', f'renamed-{i}')
+    # a value that gets past the field checks must not take the game out of the indexes
+    for collection in manager.items:
+        with contextlib.suppress(ValueError):
+            collection._set(collection.items[0], 'players', '\u00b2')
+    if not all(collection.get_item(game.name) is game for collection in manager.items for game in collection.items):
+        print('FAIL: a game can no longer be found by its title')
+        return 1
+    if not manager.check_consistency():
+        print('FAIL: the running aggregates differ from a recomputation')
+        return 1
+
+    collection = manager.items[0]
+    start = time.perf_counter()
+    report = collection.statistics()
+    running = time.perf_counter() - start
+    start = time.perf_counter()
+    CollectionAggregates(collection.items).report(f'Collection {collection.name}')
+    scan = time.perf_counter() - start
+    print(report)
+    print(f'{changes} random changes, aggregates consistent. statistics of {collection.aggregates.games} games: '
+          f'{running * 1000:.3f} ms running, {scan * 1000:.3f} ms full scan')
+    return 0
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    raise SystemExit(main(*(args + [10000, 5000, 0][len(args):])))
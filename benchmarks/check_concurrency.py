@@ -0,0 +1,147 @@
+"""
+Check that concurrent saves of the same files keep every change, exits with status 1 on a lost or doubled change.
+
+Managers in one process interleave plays, edits, renames and compactions step by step, then worker processes
+add games and play a shared game while saving (and compacting) at random moments.
+usage: python -m benchmarks.check_concurrency [processes] [rounds] [seed]
+"""
+import contextlib
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from app import storage
+
+TITLE = 'gloomhaven'
+
+
+def times_played(manager) -> int:
+    return manager.items[0].get_item(TITLE).times_played
+
+
+def check_interleaved(directory: str) -> List[str]:
+    """Return the failures of fixed interleavings of two managers, compared with the expected times played."""
+    failures = []
+    for compact, autoflush in ((False, True), (True, True), (False, False), (True, False)):
+        p = Path(directory, f'interleaved-{compact}-{autoflush}', 'boardgamecollections.yml')
+        setup = storage.get_manager(p)
+        setup.active.add_game(TITLE, '4', '120', '14')
+        storage.save_manager(p, setup)
+        first, second = storage.get_manager(p), storage.get_manager(p)
+        second.journal.autoflush = autoflush
+        first.active.play_game(TITLE)
+        second.active.play_game(TITLE)
+        storage.COMPACT_AFTER = 0 if compact else 1000
+        storage.save_manager(p, first)
+        storage.COMPACT_AFTER = 1000
+        storage.save_manager(p, second)
+        # a value set by another process between two plays: the first play is overwritten, the second counts
+        first.active.play_game(TITLE)
+        second.active.edit_game(TITLE, 'times_played', '5')
+        storage.save_manager(p, second)
+        first.active.play_game(TITLE)
+        storage.save_manager(p, first)
+        storage.save_manager(p, second)
+        fresh = storage.get_manager(p)
+        results = (times_played(first), times_played(second), times_played(fresh))
+        if results != (6, 6, 6):
+            failures.append(f'compact={compact} autoflush={autoflush}: times played (first, second, reloaded) '
+                            f'{results}, expected (6, 6, 6)')
+        for manager in (setup, first, second, fresh):
+            manager.journal.close()
+    return failures
+
+
+def check_rename(directory: str) -> List[str]:
+    """
+    Return the failures of a rating saved by one manager for a game another one renamed without writing it yet:
+    every manager must end up as the files, where the rename comes after the rating.
+    """
+    failures = []
+    for compact in (False, True):
+        p = Path(directory, f'rename-{compact}', 'boardgamecollections.yml')
+        setup = storage.get_manager(p)
+        setup.active.add_game(TITLE, '4', '120', '14')
+        storage.save_manager(p, setup)
+        first, second = storage.get_manager(p), storage.get_manager(p)
+        first.journal.autoflush = False
+        first.active.edit_game(TITLE, 'title', 'gloom')
+        second.active.rate_game(TITLE, '9')
+        storage.save_manager(p, second)
+        storage.save_manager(p, first)
+        storage.COMPACT_AFTER = 0 if compact else 1000
+        first.active.play_game('gloom')
+        storage.save_manager(p, first)
+        storage.COMPACT_AFTER = 1000
+        fresh = storage.get_manager(p)
+        results = [(game.title, game.rating) for game in (first.active.get_item('gloom'),
+                                                          fresh.active.get_item('gloom')) if game]
+        if results != [('gloom', 9)] * 2:
+            failures.append(f'rename compact={compact}: (title, rating) of (first, reloaded) {results}, '
+                            f"expected [('gloom', 9), ('gloom', 9)]")
+        for manager in (setup, first, second, fresh):
+            manager.journal.close()
+    return failures
+
+
+def worker(directory: str, number: int, rounds: int, seed: int) -> Tuple[int, int]:
+    """Add games and play the shared game, saving after every round, return the games added and plays made."""
+    rng = random.Random(seed + number)
+    storage.COMPACT_AFTER = 7
+    p = Path(directory, 'processes', 'boardgamecollections.yml')
+    manager = storage.get_manager(p)
+    manager.journal.autoflush = rng.random() < 0.5
+    added = played = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for r in range(rounds):
+            for g in range(rng.randint(0, 4)):
+                manager.active.add_game(f'p{number}-r{r}-g{g}', '2', '30', '10')
+                added += 1
+            for _ in range(rng.randint(0, 3)):
+                manager.active.play_game(TITLE)
+                played += 1
+            time.sleep(rng.random() / 200)
+            storage.save_manager(p, manager)
+    manager.journal.close()
+    return added, played
+
+
+def check_processes(directory: str, processes: int, rounds: int, seed: int) -> List[str]:
+    p = Path(directory, 'processes', 'boardgamecollections.yml')
+    setup = storage.get_manager(p)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        setup.active.add_game(TITLE, '4', '120', '14')
+    storage.save_manager(p, setup)
+    setup.journal.close()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(worker, [(directory, number, rounds, seed) for number in range(processes)])
+    fresh = storage.get_manager(p)
+    games = sum(collection.size for collection in fresh.items) - 1
+    added, played = sum(r[0] for r in results), sum(r[1] for r in results)
+    print(f'{processes} processes x {rounds} rounds: {games} of {added} games, '
+          f'played {times_played(fresh)} of {played} times')
+    if (games, times_played(fresh)) != (added, played):
+        return [f'processes: {games} of {added} games, {times_played(fresh)} of {played} plays on disk']
+    return []
+
+
+def main(processes: int, rounds: int, seed: int) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            failures = check_interleaved(directory) + check_rename(directory)
+        failures += check_processes(directory, processes, rounds, seed)
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print('No changes lost.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    raise SystemExit(main(*(args + [6, 30, 0][len(args):])))
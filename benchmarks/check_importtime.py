@@ -0,0 +1,63 @@
+"""
+Guard the cold start time of the program, exits with status 1 if a check fails.
+
+Imports `app.__main__` in fresh interpreters with `python -X importtime` (from an empty directory) and checks that
+  - the best cumulative import time is within the budget (in milliseconds)
+  - none of the modules that are only imported on demand (yaml, numpy, multiprocessing...) were imported
+  - importing created no files or directories
+
+usage: python -m benchmarks.check_importtime [budget_ms] [runs]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+# modules that are imported the first time they are needed, never at startup
+DEFERRED = ('yaml', 'numpy', 'multiprocessing', 'concurrent.futures.process', 'logging.handlers')
+
+
+def import_times(directory: str) -> Dict[str, int]:
+    """Import `app.__main__` in a new interpreter, return module -> cumulative import time in microseconds."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT), PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app.__main__'],
+                            cwd=directory, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(budget_ms: float, runs: int) -> int:
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        results = [import_times(directory) for _ in range(runs)]
+        created = os.listdir(directory)
+    best = min(times['app.__main__'] for times in results) / 1000
+    print(f'import app.__main__: best of {runs} {best:.1f} ms (budget {budget_ms:.0f} ms)')
+    if best > budget_ms:
+        failures.append(f'import time {best:.1f} ms is over the budget of {budget_ms:.0f} ms')
+    imported = sorted(name for name in results[0] if name in DEFERRED)
+    if imported:
+        failures.append(f'imported at startup: {", ".join(imported)}')
+    if created:
+        failures.append(f'created at import: {", ".join(created)}')
+
+    slowest = sorted(((us, name) for name, us in results[0].items() if name.startswith('app')), reverse=True)
+    for us, name in slowest[:5]:
+        print(f'  {name:<30}{us / 1000:>8.1f} ms')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 150
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    raise SystemExit(main(budget, count))
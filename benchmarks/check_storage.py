@@ -0,0 +1,69 @@
+"""
+Check that values up to `MAX_VALUE` survive a compaction, the snapshot and the yaml file, exits with status 1 if not.
+
+Larger values must be rejected when they are entered. usage: python -m benchmarks.check_storage
+"""
+import contextlib
+import os
+import tempfile
+from pathlib import Path
+from typing import List
+
+from app import storage
+from app.boardgame import MAX_VALUE
+from app.utils import FAILED
+
+TITLE = 'gloomhaven'
+
+
+def snapshot_version(manager) -> int:
+    return storage._HEADER.unpack_from(storage.encode_snapshot(manager, storage.NO_STAMP))[1]
+
+
+def check_values(directory: str) -> List[str]:
+    """Return the failures of storing large values, read back from the snapshot and from the yaml file"""
+    failures = []
+    p = Path(directory, 'values', 'boardgamecollections.yml')
+    manager = storage.get_manager(p)
+    collection = manager.active
+    collection.add_game(TITLE, '4', '120', '14')
+    if snapshot_version(manager) != 3:
+        failures.append(f'small values are written as version {snapshot_version(manager)}, expected 3')
+    collection.edit_game(TITLE, 'players', '9999999999')
+    collection.edit_game(TITLE, 'duration', str(MAX_VALUE))
+    collection.edit_game(TITLE, 'times_played', str(MAX_VALUE - 1))
+    collection.rate_game(TITLE, '4294967296')
+    collection.play_game(TITLE)
+    expected = collection.get_item(TITLE).save()
+    if snapshot_version(manager) != storage.SNAPSHOT_VERSION:
+        failures.append(f'large values are written as version {snapshot_version(manager)}')
+    for field in ('players', 'times_played', 'rating'):
+        if collection.edit_game(TITLE, field, str(MAX_VALUE + 1)) is not FAILED:
+            failures.append(f'{field} {MAX_VALUE + 1} was accepted')
+    storage.COMPACT_AFTER = 0
+    storage.save_manager(p, manager)
+    storage.COMPACT_AFTER = 1000
+    manager.journal.close()
+    storage.export_yaml(p)
+    snapshot, _ = storage.read_snapshot(storage.snapshot_path(p))
+    yaml, _ = storage.read_yaml(p)
+    for source, loaded in (('snapshot', snapshot), ('yaml file', yaml)):
+        game = loaded.items[0].get_item(TITLE)
+        if game is None or game.save() != expected:
+            failures.append(f'{source}: {game.save() if game else None}, expected {expected}')
+    return failures
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            failures = check_values(directory)
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print(f'Values up to {MAX_VALUE} are stored, larger ones rejected.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
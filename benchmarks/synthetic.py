@@ -0,0 +1,45 @@
+"""Seeded generators for synthetic boardgame collection data."""
+import random
+from typing import Callable, Dict, Optional
+
+from app.boardgame import BoardGame
+from app.collections import BoardGameCollection, CollectionManager
+
+# field -> value generator, in the order of `BoardGame.save()` (after the title)
+FIELDS: Dict[str, Callable[[random.Random], str]] = {
+    'players':          lambda rng: str(rng.randint(1, 8)),                                    # noqa E241
+    'duration':         lambda rng: str(rng.choice((15, 20, 30, 45, 60, 90, 120, 180, 240))),  # noqa E241
+    'recommended_age':  lambda rng: str(rng.randint(3, 18)),                                   # noqa E241
+    'times_played':     lambda rng: str(rng.randint(0, 50)),                                   # noqa E241
+    'rating':           lambda rng: rng.choice(('', str(rng.randint(0, 10)))),                 # noqa E241
+}
+
+
+def make_data(collections: int,
+              games: int,
+              seed: int = 0,
+              fields: Optional[Dict[str, Callable[[random.Random], str]]] = None) -> Dict:
+    """
+    Return a dict in the layout of `CollectionManager.save()` with `collections` x `games` games.
+
+    `fields` replaces the value generators of some fields (see `FIELDS`), eg. to skew the distribution:
+    make_data(1, 1000, fields={'times_played': lambda rng: str(int(rng.paretovariate(1.5)))})
+    """
+    rng = random.Random(seed)
+    generators = list({**FIELDS, **(fields or {})}.values())
+    return {
+        'name': 'manager',
+        'items': [
+            {
+                'name': f'collection-{c}',
+                'items': [[f'game-{c}-{g}', *(generate(rng) for generate in generators)] for g in range(games)]
+            }
+            for c in range(collections)
+        ]
+    }
+
+
+def make_manager(data: Dict) -> CollectionManager:
+    """Build a manager from the output of `make_data`."""
+    return CollectionManager(items=[BoardGameCollection(c['name'], [BoardGame(*args) for args in c['items']])
+                                    for c in data['items']])